@@ -0,0 +1,492 @@
+import os
+import sys
+import json
+import time
+import random
+import zipfile
+import argparse
+import platform
+import tempfile
+import warnings
+import subprocess
+from datetime import datetime, timedelta, time as dt_time
+from xml.sax.saxutils import escape
+from config_manager import ConfigManager
+from discovery import iter_source_files
+from excel_processor import ExcelProcessor, extract_rows
+from extraction_plan import compile_plan
+from output_sinks import OUTPUT_FORMATS
+import xlsx_reader
+
+# 合并流程基准测试：按配置生成合成工作簿语料，分别统计文件发现、单文件提取、
+# 多进程汇总、输出写入和端到端合并的耗时，结果保存为 JSON 便于前后对比。
+# 示例：
+#   python benchmark.py -c 崩塌灾害 -n 2000 --layout dense -w 8
+#   python benchmark.py --compare bench_results/old.json bench_results/new.json
+# --parity N 生成 N 个随机工作簿（日期/时长/时间格式、1900 闰年、1904 日期系统、富文本与内联字符串、
+# 布尔与错误值等），比对 fast 引擎与 openpyxl（data_only）的取值，有差异时以非零状态退出：
+#   python benchmark.py --parity 200
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>')
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'officeDocument" Target="xl/workbook.xml"/></Relationships>')
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<bookViews><workbookView activeTab="0"/></bookViews>'
+    '<sheets><sheet name="调查表" sheetId="1" r:id="rId1"/></sheets></workbook>')
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'sharedStrings" Target="sharedStrings.xml"/>'
+    '<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+    'styles" Target="styles.xml"/></Relationships>')
+
+
+def _col_letters(col):
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _styles_xml(style_count):
+    # 表单模板的样式部件往往比数据还大，用大量重复的 xf 模拟
+    xfs = '<xf numFmtId="0" fontId="0" fillId="0" borderId="0"/>' * max(1, style_count)
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            '<numFmts count="1"><numFmt numFmtId="176" formatCode="yyyy&quot;年&quot;m&quot;月&quot;d&quot;日&quot;"/>'
+            '</numFmts><fonts count="1"><font><sz val="11"/><name val="宋体"/></font></fonts>'
+            '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            f'<cellXfs count="{max(1, style_count) + 1}">{xfs}'
+            '<xf numFmtId="176" fontId="0" fillId="0" borderId="0" applyNumberFormat="1"/></cellXfs>'
+            '</styleSheet>')
+
+
+def write_synthetic_workbook(path, targets, rng, rows, cols, density, string_ratio, style_count):
+    # targets: {(row, col): 值种类}，其余单元格按 density 随机填充
+    shared = []
+    shared_index = {}
+    date_style = max(1, style_count)
+
+    def sst(text):
+        if text not in shared_index:
+            shared_index[text] = len(shared)
+            shared.append(text)
+        return shared_index[text]
+
+    max_row = max(rows, max(r for r, _ in targets))
+    max_col = max(cols, max(c for _, c in targets))
+    parts = []
+    for r in range(1, max_row + 1):
+        cells = []
+        for c in range(1, max_col + 1):
+            ref = f"{_col_letters(c)}{r}"
+            kind = targets.get((r, c))
+            if kind is None:
+                if rng.random() >= density:
+                    continue
+                kind = "str" if rng.random() < string_ratio else "num"
+            if kind == "str":
+                cells.append(f'<c r="{ref}" t="s"><v>{sst("文本%d" % rng.randint(0, 5000))}</v></c>')
+            elif kind == "date":
+                cells.append(f'<c r="{ref}" s="{date_style}"><v>{rng.randint(40000, 46000)}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"><v>{round(rng.uniform(0, 10000), 2)}</v></c>')
+        if cells:
+            parts.append(f'<row r="{r}">{"".join(cells)}</row>')
+    sheet = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             f'<dimension ref="A1:{_col_letters(max_col)}{max_row}"/>'
+             f'<sheetData>{"".join(parts)}</sheetData></worksheet>')
+    sst_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+               f'count="{len(shared)}" uniqueCount="{len(shared)}">'
+               + "".join(f"<si><t>{escape(s)}</t></si>" for s in shared) + "</sst>")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/worksheets/sheet1.xml", sheet)
+        zf.writestr("xl/sharedStrings.xml", sst_xml)
+        zf.writestr("xl/styles.xml", _styles_xml(style_count))
+
+
+def generate_corpus(corpus_dir, config, files, rows, cols, layout, string_ratio, style_count, seed=0):
+    # layout: sparse 只填配置单元格附近少量数据，dense 填满 rows x cols 区域
+    os.makedirs(corpus_dir, exist_ok=True)
+    rng = random.Random(seed)
+    density = 0.9 if layout == "dense" else 0.05
+    kinds = ("str", "num", "date")
+    targets = {xlsx_reader.parse_cell(h["cell"]): kinds[i % len(kinds)]
+               for i, h in enumerate(config["headers"])}
+    for i in range(files):
+        write_synthetic_workbook(os.path.join(corpus_dir, f"form_{i:06d}.xlsx"), targets, rng,
+                                 rows, cols, density, string_ratio, style_count)
+
+
+# 一致性检查：读取区域与各类取值
+PARITY_ROWS = 12
+PARITY_COLS = 8
+PARITY_NUMBER_FORMATS = (
+    "General", "0.00", "0.00%", '#,##0.00"元"', '0.00"d"', "[Red]#,##0", "@",
+    "yyyy-mm-dd", "mm-dd-yy", 'yyyy"年"m"月"d"日"', "yyyy/mm/dd hh:mm", "d-mmm-yy", "h:mm", "h:mm:ss AM/PM",
+    "[h]:mm:ss", "mm:ss.0", "[$-F800]dddd, mmmm dd, yyyy", "General;[Red]-General", "0.00E+00",
+)
+_PARITY_TEXT = ("文本", " 前后空格 ", "a&b<c>", "多\n行", "", "0012", "TRUE", "=不是公式", "#N/A文本")
+
+
+def _random_parity_value(rng):
+    kind = rng.randrange(9)
+    if kind == 0:
+        return rng.randint(-100000, 100000)
+    if kind == 1:
+        return round(rng.uniform(-1e6, 1e6), rng.randint(0, 6))
+    if kind == 2:
+        return rng.choice(_PARITY_TEXT) + str(rng.randint(0, 99))
+    if kind == 3:
+        return rng.random() < 0.5
+    if kind == 4:
+        # 包含 1900-02-29 附近（Excel 的闰年错误）
+        return datetime(1900, 1, 1) + timedelta(days=rng.randint(0, 120), seconds=rng.randint(0, 86399))
+    if kind == 5:
+        return datetime(1990, 1, 1) + timedelta(days=rng.randint(0, 20000), seconds=rng.randint(0, 86399))
+    if kind == 6:
+        return timedelta(hours=rng.randint(0, 200), minutes=rng.randint(0, 59), seconds=rng.randint(0, 59))
+    if kind == 7:
+        return dt_time(rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+    return rng.choice(("#N/A", "#DIV/0!", "#VALUE!", "#REF!"))
+
+
+def write_parity_workbook(path, rng):
+    # 由 openpyxl 写出，覆盖常见取值与数字格式；部分单元格为没有缓存值的公式与富文本
+    import openpyxl
+    from openpyxl.cell.rich_text import CellRichText, TextBlock
+    from openpyxl.cell.text import InlineFont
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904
+    wb = openpyxl.Workbook()
+    if rng.random() < 0.2:
+        wb.epoch = CALENDAR_MAC_1904
+    ws = wb.active
+    ws.title = "调查表"
+    for r in range(1, PARITY_ROWS + 1):
+        for c in range(1, PARITY_COLS + 1):
+            roll = rng.random()
+            if roll < 0.1:
+                continue
+            cell = ws.cell(r, c)
+            if roll < 0.13:
+                cell.value = f"=A{r}+1"
+            elif roll < 0.18:
+                cell.value = CellRichText(["前", TextBlock(InlineFont(b=True), "粗体"), str(rng.randint(0, 9))])
+            else:
+                cell.value = _random_parity_value(rng)
+                if rng.random() < 0.5 and not isinstance(cell.value, str):
+                    cell.number_format = rng.choice(PARITY_NUMBER_FORMATS)
+    wb.save(path)
+
+
+def write_raw_parity_workbook(path, rng):
+    # 直接写出 XML，覆盖 openpyxl 不会产生的写法：内联字符串、带拼音的富文本共享字符串、
+    # 公式字符串结果、错误值、指数形式的数值，以及日期/时长格式的原始序列号
+    formats = [(176, 'yyyy"年"m"月"d"日"'), (177, "[h]:mm:ss"), (178, "h:mm"), (179, '0.00"d"'), (180, "[Red]#,##0")]
+    xf_formats = [0, 14, 22, 31, 46, 47, 57, 176, 177, 178, 179, 180, 10]
+    shared = ["<si><t>普通</t></si>",
+              "<si><r><rPr><b/></rPr><t>富</t></r><r><t xml:space=\"preserve\"> 文本 </t></r>"
+              "<rPh sb=\"0\" eb=\"1\"><t>ふ</t></rPh></si>",
+              "<si><t xml:space=\"preserve\">  空格  </t></si>",
+              "<si><t>a&amp;b&lt;c&gt;</t></si>"]
+    rows = []
+    for r in range(1, PARITY_ROWS + 1):
+        cells = []
+        for c in range(1, PARITY_COLS + 1):
+            ref = f"{_col_letters(c)}{r}"
+            kind = rng.randrange(8)
+            style = f' s="{rng.randrange(len(xf_formats))}"' if rng.random() < 0.6 else ""
+            if kind == 0:
+                cells.append(f'<c r="{ref}" t="s"><v>{rng.randrange(len(shared))}</v></c>')
+            elif kind == 1:
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t>内联{rng.randint(0, 9)}</t></is></c>')
+            elif kind == 2:
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><r><t>内</t></r><r><rPr><i/></rPr><t>联</t></r>'
+                             f'</is></c>')
+            elif kind == 3:
+                cells.append(f'<c r="{ref}" t="str"><f>A1&amp;"x"</f><v>结果{rng.randint(0, 9)}</v></c>')
+            elif kind == 4:
+                cells.append(f'<c r="{ref}" t="e"><v>#N/A</v></c>')
+            elif kind == 5:
+                cells.append(f'<c r="{ref}" t="b"><v>{rng.randint(0, 1)}</v></c>')
+            elif kind == 6:
+                cells.append(f'<c r="{ref}"{style}><v>{rng.uniform(0, 3) * 10 ** rng.randint(-3, 5):.6E}</v></c>')
+            else:
+                cells.append(f'<c r="{ref}"{style}><v>{round(rng.uniform(0, 50000), rng.randint(0, 5))}</v></c>')
+        rows.append(f'<row r="{r}">{"".join(cells)}</row>')
+    sheet = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             f'<dimension ref="A1:{_col_letters(PARITY_COLS)}{PARITY_ROWS}"/>'
+             f'<sheetData>{"".join(rows)}</sheetData></worksheet>')
+    sst_xml = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+               f'count="{len(shared)}" uniqueCount="{len(shared)}">' + "".join(shared) + "</sst>")
+    num_fmts = "".join(f'<numFmt numFmtId="{i}" formatCode="{escape(code, {chr(34): "&quot;"})}"/>'
+                       for i, code in formats)
+    xfs = "".join(f'<xf numFmtId="{i}" fontId="0" fillId="0" borderId="0" applyNumberFormat="1"/>'
+                  for i in xf_formats)
+    styles = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+              f'<numFmts count="{len(formats)}">{num_fmts}</numFmts>'
+              '<fonts count="1"><font><sz val="11"/><name val="宋体"/></font></fonts>'
+              '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+              '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+              f'<cellXfs count="{len(xf_formats)}">{xfs}</cellXfs></styleSheet>')
+    workbook = _WORKBOOK
+    if rng.random() < 0.2:
+        workbook = workbook.replace("<bookViews>", '<workbookPr date1904="1"/><bookViews>')
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", workbook)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/worksheets/sheet1.xml", sheet)
+        zf.writestr("xl/sharedStrings.xml", sst_xml)
+        zf.writestr("xl/styles.xml", styles)
+
+
+def run_parity(files, seed=0, corpus_dir=None):
+    # 返回不一致的单元格列表 [(文件, 单元格, fast 取值, openpyxl 取值), ...]
+    config = {"headers": [{"name": f"{_col_letters(c)}{r}", "cell": f"{_col_letters(c)}{r}"}
+                          for r in range(1, PARITY_ROWS + 1) for c in range(1, PARITY_COLS + 1)]}
+    plan = compile_plan(config)
+    rng = random.Random(seed)
+    mismatches = []
+    with tempfile.TemporaryDirectory(prefix="parity_") as temp_dir:
+        corpus_dir = corpus_dir or temp_dir
+        os.makedirs(corpus_dir, exist_ok=True)
+        for i in range(files):
+            path = os.path.join(corpus_dir, f"parity_{i:05d}.xlsx")
+            (write_raw_parity_workbook if i % 2 else write_parity_workbook)(path, rng)
+            fast = extract_rows(path, plan, "fast")
+            with warnings.catch_warnings():
+                # openpyxl 对超出日期范围的序列号给出警告并按 #VALUE! 返回，这里只比较取值
+                warnings.simplefilter("ignore")
+                reference = extract_rows(path, plan, "openpyxl")
+            for name, a, b in zip(plan.header_names, fast[0], reference[0]):
+                if a != b or type(a) is not type(b):
+                    mismatches.append((os.path.basename(path), name, a, b))
+    return mismatches
+
+
+def peak_rss_mb():
+    # 当前进程与已结束子进程的峰值常驻内存（MB）；Windows 上无 resource 模块时返回 None
+    if resource is None:
+        return None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(max(own, children), 1)
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(corpus_dir, config, workers=1, engine="fast", out_dir=None, output_formats=("xlsx",)):
+    results = {"stages": {}}
+    stages = results["stages"]
+    plan = compile_plan(config)
+
+    # 1. 文件发现
+    start = time.perf_counter()
+    sources = list(iter_source_files(corpus_dir))
+    elapsed = time.perf_counter() - start
+    total_bytes = sum(s.size for s in sources)
+    stages["discovery"] = {"seconds": round(elapsed, 4), "files": len(sources),
+                           "files_per_sec": round(len(sources) / elapsed, 1) if elapsed else None}
+
+    # 2. 单文件提取（当前进程内逐个计时）
+    latencies = []
+    rows = []
+    start = time.perf_counter()
+    for source in sources:
+        t0 = time.perf_counter()
+        rows.extend(extract_rows(source.path, plan, engine))
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    stages["extraction"] = {
+        "seconds": round(elapsed, 4),
+        "files_per_sec": round(len(sources) / elapsed, 1) if elapsed else None,
+        "mb_per_sec": round(total_bytes / 1048576 / elapsed, 2) if elapsed else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+    # 3. 汇总：按配置的进程数提取并按顺序收集结果（含进程间传输与排序开销）
+    processor = ExcelProcessor(corpus_dir, out_dir or corpus_dir, config, logger=lambda msg: None,
+                               workers=workers, engine=engine)
+    start = time.perf_counter()
+    collected = sum(1 for _, row, error, _ in processor.iter_extracted(iter(sources), plan) if error is None)
+    elapsed = time.perf_counter() - start
+    stages["aggregation"] = {"seconds": round(elapsed, 4), "workers": workers, "rows": collected,
+                             "files_per_sec": round(len(sources) / elapsed, 1) if elapsed else None,
+                             "peak_rss_mb": peak_rss_mb()}
+
+    # 4. 输出写入：每种格式分别计时，xlsx 记为 output 以便与历史结果对比
+    out_dir = out_dir or os.path.join(corpus_dir, "_bench_out")
+    os.makedirs(out_dir, exist_ok=True)
+    for fmt in output_formats:
+        start = time.perf_counter()
+        sink = OUTPUT_FORMATS[fmt](out_dir, "bench")
+        sink.open(plan.header_names)
+        for row in rows:
+            sink.write_row(row)
+        out_path = sink.close()
+        elapsed = time.perf_counter() - start
+        os.remove(out_path)
+        stages["output" if fmt == "xlsx" else f"output_{fmt}"] = {
+            "seconds": round(elapsed, 4), "rows": len(rows),
+            "rows_per_sec": round(len(rows) / elapsed, 1) if elapsed else None,
+            "peak_rss_mb": peak_rss_mb()}
+    del rows
+
+    # 5. 端到端合并
+    processor = ExcelProcessor(corpus_dir, out_dir, config, logger=lambda msg: None,
+                               workers=workers, engine=engine)
+    start = time.perf_counter()
+    out_path, row_count, metrics = processor.merge_excels()
+    elapsed = time.perf_counter() - start
+    os.remove(out_path)
+    stages["end_to_end"] = {"seconds": round(elapsed, 4), "rows": row_count,
+                            "files_per_sec": round(len(sources) / elapsed, 1) if elapsed else None,
+                            "peak_rss_mb": peak_rss_mb(), "metrics": metrics.to_dict()}
+
+    results["corpus"] = {"files": len(sources), "total_mb": round(total_bytes / 1048576, 2)}
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(baseline_path, current_path):
+    # 打印两次结果各阶段耗时的变化
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(current_path, "r", encoding="utf-8") as f:
+        current = json.load(f)
+    print(f"{'阶段':<14}{'基准(s)':>12}{'当前(s)':>12}{'变化':>10}")
+    for stage, data in current["stages"].items():
+        old = baseline.get("stages", {}).get(stage, {}).get("seconds")
+        new = data.get("seconds")
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "-"
+        print(f"{stage:<14}{old if old is not None else '-':>12}{new:>12}{change:>10}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel合并工具 - 合并流程基准测试")
+    parser.add_argument("-c", "--config", default="崩塌灾害", help="配置名称（configs 目录下的文件名）")
+    parser.add_argument("--configs-dir", default="configs")
+    parser.add_argument("--corpus-dir", help="语料目录，默认 bench_corpus/<参数组合>；已存在时直接复用")
+    parser.add_argument("-n", "--files", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=80, help="每个工作表的数据行数")
+    parser.add_argument("--cols", type=int, default=26, help="每个工作表的数据列数")
+    parser.add_argument("--layout", choices=("sparse", "dense"), default="sparse")
+    parser.add_argument("--string-ratio", type=float, default=0.5, help="随机填充单元格中共享字符串的比例")
+    parser.add_argument("--styles", type=int, default=200, help="styles.xml 中的单元格样式数量")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--engine", default="fast")
+    parser.add_argument("-f", "--format", dest="formats", action="append", choices=list(OUTPUT_FORMATS),
+                        help="输出阶段要测试的格式，可重复指定，默认 xlsx")
+    parser.add_argument("-o", "--output", help="结果 JSON 路径，默认 bench_results/bench_<时间>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="对比两次结果后退出")
+    parser.add_argument("--parity", type=int, metavar="N",
+                        help="生成 N 个随机工作簿，检查 fast 引擎与 openpyxl 的取值一致后退出")
+    parser.add_argument("--seed", type=int, default=0, help="--parity 的随机种子")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return 0
+    if args.parity:
+        mismatches = run_parity(args.parity, args.seed, args.corpus_dir)
+        for file_name, cell, fast, reference in mismatches[:50]:
+            print(f"{file_name} {cell}: fast={fast!r} openpyxl={reference!r}")
+        print(f"检查 {args.parity} 个工作簿，不一致的单元格 {len(mismatches)} 个")
+        return 1 if mismatches else 0
+
+    config_mgr = ConfigManager(args.configs_dir)
+    filename = args.config if args.config.endswith(".json") else f"{args.config}.json"
+    config = config_mgr.load_config(os.path.join(config_mgr.configs_dir, filename))
+    params = {"config": filename, "files": args.files, "rows": args.rows, "cols": args.cols,
+              "layout": args.layout, "string_ratio": args.string_ratio, "styles": args.styles}
+    corpus_dir = args.corpus_dir or os.path.join(
+        "bench_corpus", f"{os.path.splitext(filename)[0]}_{args.files}_{args.layout}_{args.rows}x{args.cols}")
+    if not os.path.isdir(corpus_dir) or not os.listdir(corpus_dir):
+        print(f"生成语料: {corpus_dir}", file=sys.stderr)
+        generate_corpus(corpus_dir, config, args.files, args.rows, args.cols, args.layout,
+                        args.string_ratio, args.styles)
+
+    results = run_benchmark(corpus_dir, config, workers=max(1, args.workers), engine=args.engine,
+                            output_formats=args.formats or ("xlsx",))
+    results.update({
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _git_commit(),
+        "params": params,
+        "workers": args.workers,
+        "engine": args.engine,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    })
+    output = args.output or os.path.join("bench_results", f"bench_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=4)
+    print(json.dumps(results["stages"], ensure_ascii=False, indent=4))
+    print(f"结果已保存: {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+import os
+import sys
+import time
+import json
+import signal
+import argparse
+from config_manager import ConfigManager
+from excel_processor import ENGINES
+from output_sinks import OUTPUT_FORMATS
+from job_queue import JobQueue, MergeJob, DONE
+from memory_budget import MIN_BUDGET_MB
+from watcher import FolderWatcher, DEFAULT_INTERVAL, DEFAULT_SETTLE_SECS
+from template_fingerprint import learn_fingerprint
+
+# 命令行批处理入口：不依赖 PyQt5，可在 Linux 服务器上定时执行合并。
+# 示例：
+#   python cli.py D:/data/县A -c 崩塌灾害 -o out_put
+#   python cli.py --job D:/data/县A 崩塌灾害 --job D:/data/县B 崩塌灾害6 -o out_put -w 16
+#   python cli.py --job D:/data/县A 崩塌灾害 --job D:/data/县B 崩塌灾害 -o out_put -w 16 -j 4
+#   python cli.py -c 崩塌灾害 --learn-fingerprint D:/data/样本.xlsx
+#   python cli.py D:/data/县A -c 崩塌灾害 --auto-config
+
+
+def log(msg):
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {msg}", file=sys.stderr, flush=True)
+
+
+def config_path(config_mgr, name):
+    # 接受 configs 目录下的文件名（可省略 .json）或直接给出的路径，返回配置文件路径
+    if os.path.isfile(name):
+        return name
+    filename = name if name.endswith(".json") else f"{name}.json"
+    path = os.path.join(config_mgr.configs_dir, filename)
+    if not os.path.exists(path):
+        raise ValueError(f"配置文件不存在: {filename}（可用配置: {', '.join(config_mgr.list_configs())}）")
+    return path
+
+
+def resolve_config(config_mgr, name):
+    # 返回校验并编译后的配置
+    return config_mgr.compile_config(config_path(config_mgr, name))
+
+
+def save_fingerprint(configs_dir, config_name, sample, engine="fast"):
+    # 从样本工作簿生成模板指纹并写入配置文件
+    config_mgr = ConfigManager(configs_dir)
+    path = config_path(config_mgr, config_name)
+    fingerprint = learn_fingerprint(sample, config_mgr.compile_config(path), engine)
+    config = config_mgr.load_config(path)
+    config["fingerprint"] = fingerprint
+    config_mgr.save_config(config, path)
+    log(f"模板指纹已写入 {path}: {json.dumps(fingerprint, ensure_ascii=False)}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Excel合并工具 - 命令行批处理")
+    parser.add_argument("src_dir", nargs="?", help="源目录（与 -c 配合使用）")
+    parser.add_argument("-c", "--config", help="配置名称（configs 目录下的文件名）或配置文件路径")
+    parser.add_argument("--job", nargs=2, action="append", default=[], metavar=("SRC_DIR", "CONFIG"),
+                        help="追加一个合并任务，可重复指定")
+    parser.add_argument("-o", "--out-dir", default="out_put", help="输出目录，默认 out_put")
+    parser.add_argument("-f", "--format", dest="formats", action="append", choices=list(OUTPUT_FORMATS),
+                        help="输出格式，可重复指定以同时写出多种格式，默认 xlsx（parquet 需要 pyarrow）")
+    parser.add_argument("--upsert", metavar="KEY_COLUMN",
+                        help="增量合并：以该表头为标识列，只提取新增或变化的文件并更新上一次的输出")
+    parser.add_argument("--timeout", type=float, default=300,
+                        help="单个文件的最长提取时间（秒），超时的工作进程被终止并记为失败；0 表示不限，默认 300")
+    parser.add_argument("--retries", type=int, default=2, help="暂时性读取错误（如网络共享）的重试次数，默认 2")
+    parser.add_argument("--no-journal", action="store_true", help="不写检查点日志（中断后无法从中断处继续）")
+    parser.add_argument("--prefetch", type=int, metavar="N",
+                        help="预读后续 N 个文件的内容，使网络读取与解析重叠；0 为关闭，默认源目录在网络共享上时自动启用")
+    parser.add_argument("--prefetch-mb", type=int, default=256, help="预读缓冲的内存上限（MB），默认 256")
+    parser.add_argument("--dedup", action="store_true", help="跳过内容完全相同的重复源文件（解析前比对内容哈希）")
+    parser.add_argument("--dedup-key", metavar="KEY_COLUMN",
+                        help="以该表头为标识列，跳过完全相同的重复记录，标识相同但内容不同的记录报告为冲突")
+    parser.add_argument("--memory-mb", type=int, metavar="MB",
+                        help=f"每个任务的缓冲区内存预算（MB，至少 {MIN_BUDGET_MB}）：限制待提取文件队列、预读缓冲、去重标识、"
+                             "检查点索引与输出批次，超出部分暂存到输出目录下的临时文件；不含解释器、依赖库与工作进程"
+                             "本身的内存（通常 50-150 MB），进程峰值为两者之和；默认不限制")
+    parser.add_argument("--auto-config", action="store_true",
+                        help="按模板指纹为每个文件自动选用配置目录中表头相同的配置（如同一表单的不同模板版本）")
+    parser.add_argument("--learn-fingerprint", metavar="SAMPLE",
+                        help="从样本工作簿生成模板指纹并写入 -c 指定的配置，然后退出")
+    parser.add_argument("--watch", action="store_true",
+                        help="监视模式：持续扫描源目录，新增或修改的文件写完后增量合并并更新输出，Ctrl+C 停止；"
+                             "标识列取 --upsert，缺省为配置的 key_column 或第一个逐条记录取值的列")
+    parser.add_argument("--watch-interval", type=float, default=DEFAULT_INTERVAL, metavar="SECS",
+                        help=f"监视模式的扫描间隔（秒），默认 {DEFAULT_INTERVAL:g}")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECS, metavar="SECS",
+                        help=f"文件大小与修改时间保持不变多少秒后视为写完，默认 {DEFAULT_SETTLE_SECS:g}")
+    parser.add_argument("--configs-dir", default="configs", help="配置目录，默认 configs")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="提取进程数，所有任务共用同一个进程池")
+    parser.add_argument("-j", "--parallel-jobs", type=int, default=1,
+                        help="同时运行的合并任务数，多个任务共用提取进程池，默认 1（依次执行）")
+    parser.add_argument("--engine", choices=ENGINES, default="fast",
+                        help="单元格提取引擎：fast（默认）、nostyles（不读取样式，日期输出为序列号）、openpyxl")
+    parser.add_argument("--cache", default=os.path.join("logs", "extract_cache.sqlite"),
+                        help="提取缓存文件路径")
+    parser.add_argument("--no-cache", action="store_true", help="不使用提取缓存")
+    parser.add_argument("-r", "--recursive", action="store_true", help="递归处理子目录")
+    parser.add_argument("--include", action="append", default=[], metavar="PATTERN",
+                        help="只处理匹配的文件（通配符，匹配相对路径或文件名），可重复指定")
+    parser.add_argument("--exclude", action="append", default=[], metavar="PATTERN",
+                        help="跳过匹配的文件或子目录，可重复指定")
+    parser.add_argument("--metrics", metavar="PATH", help="把各任务的分阶段计时与计数写入 JSON 文件")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="在当前进程内提取并保存 cProfile 结果（多个任务时文件名追加源目录名）")
+    return parser
+
+
+def collect_jobs(args, parser):
+    jobs = [tuple(job) for job in args.job]
+    if args.src_dir:
+        if not args.config:
+            parser.error("指定源目录时需要同时指定 -c/--config")
+        jobs.insert(0, (args.src_dir, args.config))
+    elif args.config:
+        parser.error("-c/--config 需要配合源目录使用")
+    if not jobs:
+        parser.error("至少需要一个合并任务（源目录 + -c 配置，或 --job）")
+    return jobs
+
+
+def progress_printer(label):
+    last = {"percent": -1}
+
+    def on_status(file_name, processed_files, total_files, remain_secs, throughput):
+        percent = int(processed_files / total_files * 100)
+        if percent != last["percent"]:
+            last["percent"] = percent
+            remaining_time = time.strftime('%H:%M:%S', time.gmtime(remain_secs))
+            log(f"[{label}] {processed_files}/{total_files} ({percent}%)，"
+                f"{throughput['files_per_sec']:.1f} 个/秒，{throughput['mb_per_sec']:.1f} MB/秒，"
+                f"预计剩余时间: {remaining_time}")
+    return on_status
+
+
+def profile_path_for(profile, label, job_count):
+    if not profile or job_count == 1:
+        return profile
+    base, ext = os.path.splitext(profile)
+    return f"{base}_{label}{ext or '.prof'}"
+
+
+def run_jobs(jobs, out_dir, configs_dir="configs", workers=1, engine="fast", cache_path=None,
+             recursive=False, include=None, exclude=None, metrics_path=None, profile=None,
+             output_formats=("xlsx",), upsert_key=None, file_timeout=None, retries=2, journal=True,
+             prefetch=None, prefetch_mb=256, dedup=False, dedup_key=None, parallel_jobs=1, auto_config=False,
+             memory_mb=None):
+    # 通过任务队列执行多个 (源目录, 配置) 任务，共用一个进程池与提取缓存，最多同时运行 parallel_jobs 个；
+    # 返回失败任务数
+    config_mgr = ConfigManager(configs_dir)
+    # 开始合并前先校验全部任务的配置，有误的任务直接跳过
+    plans = {}
+    for _, config_name in jobs:
+        if config_name not in plans:
+            try:
+                plans[config_name] = resolve_config(config_mgr, config_name)
+            except ValueError as e:
+                plans[config_name] = None
+                log(f"配置 {config_name} 有误，相关任务将跳过: {e}")
+    templates = None
+    if auto_config:
+        templates, errors = config_mgr.compile_templates()
+        for error in errors:
+            log(f"配置有误，不参与模板匹配: {error}")
+    os.makedirs(out_dir, exist_ok=True)
+    printers = {}
+
+    def on_status(job, *args):
+        printers.setdefault(job.id, progress_printer(job.label))(*args, job.throughput)
+
+    def on_job_finished(job):
+        if job.state == DONE:
+            log(f"[{job.label}] 合并完成: {', '.join(job.out_paths)}，记录数 {job.rows}，用时 {job.elapsed:.1f} 秒")
+
+    queue = JobQueue(workers=workers, max_concurrent=parallel_jobs, engine=engine, cache_path=cache_path,
+                     file_timeout=file_timeout, logger=log, on_status=on_status, on_job_finished=on_job_finished)
+    failures = 0
+    for src_dir, config_name in jobs:
+        if plans[config_name] is None:
+            failures += 1
+            continue
+        label = os.path.basename(os.path.normpath(src_dir))
+        queue.add(MergeJob(src_dir, plans[config_name], out_dir, label=label, config_name=config_name,
+                           recursive=recursive, include=include, exclude=exclude,
+                           profile_path=profile_path_for(profile, label, len(jobs)),
+                           output_formats=output_formats, upsert_key=upsert_key, retries=retries,
+                           journal=journal, prefetch=prefetch, prefetch_mb=prefetch_mb, dedup=dedup,
+                           dedup_key=dedup_key, templates=templates, memory_mb=memory_mb))
+    try:
+        queue.start()
+        queue.wait()
+    except KeyboardInterrupt:
+        queue.cancel()
+        queue.wait()
+        raise
+    finally:
+        job_metrics = []
+        for job in queue.jobs:
+            if job.state != DONE:
+                failures += 1
+                continue
+            processor = job.processor
+            job_metrics.append({"src_dir": job.src_dir, "config": job.config_name, "out_paths": job.out_paths,
+                                "error_report": processor.error_report_path,
+                                "dedup_report": processor.dedup_report_path,
+                                "type_report": processor.type_report_path,
+                                "rows": job.rows, "metrics": job.metrics.to_dict()})
+        if metrics_path:
+            with open(metrics_path, "w", encoding="utf-8") as f:
+                json.dump(job_metrics, f, ensure_ascii=False, indent=4)
+    return failures
+
+
+def run_watch(args):
+    # 监视单个源目录并持续增量合并，直到 Ctrl+C 或收到 SIGTERM；返回退出码
+    config_mgr = ConfigManager(args.configs_dir)
+    try:
+        plan = resolve_config(config_mgr, args.config)
+    except ValueError as e:
+        log(f"配置 {args.config} 有误: {e}")
+        return 1
+    templates = None
+    if args.auto_config:
+        templates, errors = config_mgr.compile_templates()
+        for error in errors:
+            log(f"配置有误，不参与模板匹配: {error}")
+    key_column = args.upsert or plan.default_key_column
+    os.makedirs(args.out_dir, exist_ok=True)
+    try:
+        watcher = FolderWatcher(args.src_dir, args.out_dir, plan, key_column, interval=args.watch_interval,
+                                settle_secs=args.settle, workers=max(1, args.workers), engine=args.engine,
+                                cache_path=None if args.no_cache else args.cache, logger=log,
+                                recursive=args.recursive, include=args.include, exclude=args.exclude,
+                                file_timeout=args.timeout or None, output_formats=args.formats or ("xlsx",),
+                                retries=max(0, args.retries), prefetch=args.prefetch,
+                                prefetch_mb=max(1, args.prefetch_mb), dedup=args.dedup, dedup_key=args.dedup_key,
+                                templates=templates, memory_mb=args.memory_mb)
+    except ValueError as e:
+        log(f"无法开始监视: {e}")
+        return 1
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.learn_fingerprint:
+        if not args.config:
+            parser.error("--learn-fingerprint 需要同时指定 -c/--config")
+        try:
+            save_fingerprint(args.configs_dir, args.config, args.learn_fingerprint, args.engine)
+        except (ValueError, OSError) as e:
+            log(f"生成模板指纹失败: {e}")
+            return 1
+        return 0
+    if args.memory_mb is not None and args.memory_mb < MIN_BUDGET_MB:
+        parser.error(f"--memory-mb 至少为 {MIN_BUDGET_MB}")
+    if args.watch:
+        if not args.src_dir or not args.config or args.job:
+            parser.error("--watch 需要一个源目录与 -c/--config，不能与 --job 同时使用")
+        return run_watch(args)
+    jobs = collect_jobs(args, parser)
+    failures = run_jobs(jobs, args.out_dir, configs_dir=args.configs_dir, workers=max(1, args.workers),
+                        engine=args.engine, cache_path=None if args.no_cache else args.cache,
+                        recursive=args.recursive, include=args.include, exclude=args.exclude,
+                        metrics_path=args.metrics, profile=args.profile,
+                        output_formats=args.formats or ("xlsx",), upsert_key=args.upsert,
+                        file_timeout=args.timeout or None, retries=max(0, args.retries),
+                        journal=not args.no_journal, prefetch=args.prefetch, prefetch_mb=max(1, args.prefetch_mb),
+                        dedup=args.dedup, dedup_key=args.dedup_key, parallel_jobs=max(1, args.parallel_jobs),
+                        auto_config=args.auto_config, memory_mb=args.memory_mb)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import re
+import unicodedata
+from datetime import datetime, date, time, timedelta
+
+# 按列的类型转换：表头可指定 "type"，合并时在写出前对一批记录逐列统一转换，
+# 文本形式的数字、带单位的数值、多种格式的日期等得到一致的类型。支持：
+#   "type": "int" / "float" / "date" / "str"
+#   "type": {"type": "float", "unit": "m"}               数值后可带单位（不指定时接受常用单位，或只允许指定的单位）
+#   "type": {"type": "date", "formats": ["%Y年%m月%d日"]}  追加日期格式（默认已支持常见格式与 Excel 序列号）
+#   "type": {"type": "enum", "values": ["是", "否"]}      只允许列出的取值；values 为对象时按别名映射到标准值
+#   "type": {"type": "regex", "pattern": "([0-9.]+)", "then": "float"}  取第一个分组（无分组时取整个匹配），可再转换类型
+# 转换失败的单元格置为空值，并记入错误清单（不中断合并）；空值不做转换。
+
+TYPE_NAMES = ("int", "float", "date", "str", "enum", "regex")
+
+DEFAULT_DATE_FORMATS = (
+    "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%Y年%m月%d日", "%Y%m%d",
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M",
+    "%Y年%m月%d日 %H:%M", "%Y年%m月", "%Y-%m", "%Y/%m",
+)
+
+# 数值 + 可选单位，如 "12.5"、"1,200 m"、"30㎡"（全角字符先按 NFKC 规范化）；千位分隔符须三位一组
+_NUMBER_RE = re.compile(r"^([+-]?(?:(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)\s*(.*)$")
+# 未限定单位时，后缀须像单位：汉字等文字或货币、百分号等符号，可带平方/立方（㎡ 规范化后为 m2），
+# 可用 / 连接，如 "万元"、"m/s"、"kg/m3"；英文字母只接受下列常用单位（不区分大小写）。
+# 含其他数字或日期分隔符（- . :）的后缀不是单位，如 "2023-05-01"、"3-5"、"1/2"、"12abc" 均为转换失败
+_UNIT_RE = re.compile(r"^(?:[%‰°$¥€£]|[^\W\d_]+[23]?)(?:/?(?:[%‰°$¥€£]|[^\W\d_]+[23]?))*$")
+_ASCII_UNIT_RE = re.compile(r"[A-Za-z]+")
+COMMON_UNITS = frozenset((
+    "mm", "cm", "dm", "m", "km", "mu", "ha", "mg", "g", "kg", "t", "ml", "l", "s", "sec", "min", "h", "hr", "d",
+    "pa", "kpa", "mpa", "gpa", "n", "kn", "w", "kw", "mw", "kwh", "v", "kv", "a", "ma", "mah", "hz", "khz", "mhz",
+    "db", "c", "f", "k", "kb", "mb", "gb", "tb", "pcs", "rmb", "usd", "cny",
+))
+_EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# 每个转换错误清单最多保留的条目数，超出后只计数
+MAX_ERROR_ENTRIES = 10000
+
+
+class _Invalid:
+    # 转换失败的标记，携带原因
+    __slots__ = ("reason",)
+
+    def __init__(self, reason):
+        self.reason = reason
+
+
+def _number(value, unit):
+    if isinstance(value, bool):
+        return _Invalid("布尔值不能转换为数值")
+    if isinstance(value, (int, float)):
+        return value
+    if not isinstance(value, str):
+        return _Invalid("不是数值")
+    match = _NUMBER_RE.match(unicodedata.normalize("NFKC", value).strip())
+    if not match:
+        return _Invalid("不是数值")
+    suffix = match.group(2)
+    if suffix and unit is not None:
+        if suffix not in unit:
+            return _Invalid(f"单位“{suffix}”不在允许的单位中")
+    elif suffix and not (_UNIT_RE.match(suffix)
+                         and all(t.lower() in COMMON_UNITS for t in _ASCII_UNIT_RE.findall(suffix))):
+        return _Invalid(f"不是数值（“{suffix}”不是单位）")
+    number = match.group(1).replace(",", "")
+    return float(number) if any(ch in number for ch in ".eE") else int(number)
+
+
+def _to_float(unit):
+    def convert(value):
+        number = _number(value, unit)
+        return number if isinstance(number, _Invalid) else float(number)
+    return convert
+
+
+def _to_int(unit):
+    def convert(value):
+        number = _number(value, unit)
+        if isinstance(number, float):
+            if not number.is_integer():
+                return _Invalid("不是整数")
+            return int(number)
+        return number
+    return convert
+
+
+def _to_date(formats):
+    def convert(value):
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # Excel 序列号（如 nostyles 引擎输出的日期）
+            if not 0 < value < 2958466:
+                return _Invalid("日期序列号超出范围")
+            return _EXCEL_EPOCH + timedelta(days=value)
+        if isinstance(value, time) or not isinstance(value, str):
+            return _Invalid("不是日期")
+        text = unicodedata.normalize("NFKC", value).strip()
+        for fmt in formats:
+            try:
+                return datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+        return _Invalid("无法识别的日期格式")
+    return convert
+
+
+def _to_str(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def _to_enum(values):
+    if isinstance(values, dict):
+        mapping = {str(k).strip(): v for k, v in values.items()}
+        mapping.update({str(v).strip(): v for v in values.values()})
+    else:
+        mapping = {str(v).strip(): v for v in values}
+
+    def convert(value):
+        key = _to_str(value)
+        if key in mapping:
+            return mapping[key]
+        return _Invalid("不在允许的取值中")
+    return convert
+
+
+def _to_regex(pattern, then):
+    def convert(value):
+        match = pattern.search(_to_str(value))
+        if not match:
+            return _Invalid("不符合正则表达式")
+        text = match.group(1) if pattern.groups else match.group(0)
+        return then(text) if then else text
+    return convert
+
+
+def compile_type(spec):
+    # 返回单元格转换函数，规格有误时抛出 ValueError
+    original = spec
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    if not isinstance(spec, dict) or spec.get("type") not in TYPE_NAMES:
+        raise ValueError(f"未知的类型: {original}（可用: {', '.join(TYPE_NAMES)}）")
+    kind = spec["type"]
+    unit = spec.get("unit")
+    if unit is not None:
+        if isinstance(unit, str):
+            unit = [unit]
+        if not isinstance(unit, list) or not all(isinstance(u, str) for u in unit):
+            raise ValueError(f"{kind}.unit 应为单位或单位列表（字符串）")
+        unit = [unicodedata.normalize("NFKC", u).strip() for u in unit]
+    if kind == "int":
+        return _to_int(unit)
+    if kind == "float":
+        return _to_float(unit)
+    if kind == "date":
+        formats = spec.get("formats") or []
+        if not isinstance(formats, list) or not all(isinstance(f, str) for f in formats):
+            raise ValueError("date.formats 应为格式列表（字符串）")
+        return _to_date(list(formats) + [f for f in DEFAULT_DATE_FORMATS if f not in formats])
+    if kind == "str":
+        return _to_str
+    if kind == "enum":
+        values = spec.get("values")
+        if not values or not isinstance(values, (list, dict)):
+            raise ValueError("enum 需要 values（取值列表或别名映射）")
+        return _to_enum(values)
+    if not isinstance(spec.get("pattern") or "", str):
+        raise ValueError(f"regex 的 pattern 应为文本: {spec.get('pattern')}")
+    try:
+        pattern = re.compile(spec.get("pattern") or "")
+    except re.error as e:
+        raise ValueError(f"正则表达式无效: {spec.get('pattern')}（{e}）")
+    if not pattern.pattern:
+        raise ValueError("regex 需要 pattern")
+    then = spec.get("then")
+    if then is not None and then == "regex":
+        raise ValueError("regex 的 then 不能再是 regex")
+    return _to_regex(pattern, compile_type(then) if then else None)
+
+
+class ConversionErrors:
+    # 一次合并中的转换错误清单（错误掩码）：出错的文件、记录序号（文件内从 1 开始）、列、原值与原因
+    def __init__(self):
+        self.entries = []
+        self.by_column = {}
+        self.count = 0
+
+    def add(self, file_name, record, column, value, reason):
+        self.count += 1
+        self.by_column[column] = self.by_column.get(column, 0) + 1
+        if len(self.entries) < MAX_ERROR_ENTRIES:
+            self.entries.append({"file": file_name, "record": record, "column": column,
+                                 "value": value, "error": reason})
+
+    def summary(self):
+        return f"类型转换失败 {self.count} 个单元格（" + "，".join(f"{k} {v}" for k, v in self.by_column.items()) + "）"
+
+    def to_dict(self):
+        return {"failed_cells": self.count, "by_column": dict(self.by_column), "cells": self.entries}
+
+
+class ColumnTypes:
+    # 编译后的按列类型规格；convert 对一批记录逐列转换
+    def __init__(self, header_names, specs):
+        # specs: {列序号: 类型规格}
+        self.header_names = header_names
+        self.specs = specs
+        self.converters = [(index, compile_type(spec)) for index, spec in sorted(specs.items())]
+
+    def __reduce__(self):
+        # 转换函数为闭包，传给工作进程时按规格重新编译
+        return ColumnTypes, (self.header_names, self.specs)
+
+    def convert(self, rows, file_name, errors):
+        # 原地转换 rows 中的类型列；同一列中重复出现的取值只转换一次
+        if not rows:
+            return rows
+        for index, converter in self.converters:
+            column = [row[index] for row in rows]
+            done = {}
+            for record, value in enumerate(column, 1):
+                if value is None or value == "":
+                    converted = None
+                else:
+                    # 按 (类型, 值) 记忆，避免 1、1.0 与 True 互相命中
+                    key = (value.__class__, value)
+                    try:
+                        converted = done[key]
+                    except KeyError:
+                        converted = done[key] = converter(value)
+                    except TypeError:
+                        converted = converter(value)
+                    if isinstance(converted, _Invalid):
+                        errors.add(file_name, record, self.header_names[index], value, converted.reason)
+                        converted = None
+                rows[record - 1][index] = converted
+        return rows
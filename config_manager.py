@@ -1,16 +1,32 @@
 import json
 import os
 import shutil
+from extraction_plan import compile_plan, config_hash
 
 class ConfigManager:
     def __init__(self, configs_dir="configs", default_file="default.json"):
         self.configs_dir = configs_dir
+        # 编译结果缓存：绝对路径 -> ((修改时间, 大小), ExtractionPlan)
+        self._compiled = {}
         os.makedirs(self.configs_dir, exist_ok=True)
         self.default_path = os.path.join(self.configs_dir, default_file)
         if not os.path.exists(self.default_path):
             self.save_config({"headers": []}, self.default_path)
         self.config = self.load_config(self.default_path)
 
+    @staticmethod
+    def config_hash(config):
+        return config_hash(config)
+
+    @staticmethod
+    def validate(config):
+        # 返回错误信息，配置有效时返回 None
+        try:
+            compile_plan(config)
+        except ValueError as e:
+            return str(e)
+        return None
+
     def list_configs(self):
         return [f for f in os.listdir(self.configs_dir) if f.endswith(".json")]
 
@@ -18,9 +34,46 @@ class ConfigManager:
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
 
+    def compile_config(self, path):
+        # 校验并编译配置文件，配置有误时抛出 ValueError；文件未修改时直接复用上次的编译结果
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._compiled.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        plan = compile_plan(self.load_config(path), os.path.splitext(os.path.basename(path))[0])
+        self._compiled[key] = (stamp, plan)
+        return plan
+
+    def compile_templates(self):
+        # 编译配置目录中所有带模板指纹的配置，作为按指纹自动选择配置的候选；
+        # 返回 (ExtractionPlan 列表, 错误信息列表)，有误的配置不参与选择
+        plans, errors = [], []
+        for filename in sorted(self.list_configs()):
+            path = os.path.join(self.configs_dir, filename)
+            try:
+                config = self.load_config(path)
+                if not isinstance(config, dict):
+                    raise ValueError("配置应为 JSON 对象")
+                if not config.get("fingerprint"):
+                    continue
+                plans.append(self.compile_config(path))
+            except (ValueError, OSError) as e:
+                errors.append(f"{filename}: {e}")
+        return plans, errors
+
     def save_config(self, config, path):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(config, f, ensure_ascii=False, indent=4)
+        # 内容未变化时不重写文件，保留修改时间，编译结果可继续复用
+        text = json.dumps(config, ensure_ascii=False, indent=4)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                unchanged = f.read() == text
+        else:
+            unchanged = False
+        if not unchanged:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
         self.config = config
 
     def rename_config(self, old_name, new_name):
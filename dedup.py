@@ -0,0 +1,140 @@
+import hashlib
+from extract_cache import file_digest
+from memory_budget import SpillMap
+
+# 合并时去重：
+#   1. 内容完全相同的源文件（复制到多个子目录、改名重复提交）在解析前跳过，只保留第一个。
+#      只有大小与之前某个文件相同时才计算内容哈希，大多数文件不需要额外读取。
+#      计算哈希时读取出错（网络共享暂时中断、文件已删除）的文件不做此项检查，照常交给提取，
+#      由提取过程重试或报告失败；这些文件记入去重清单。
+#   2. 设置标识列时，标识与全部取值都相同的记录视为重复并跳过；
+#      标识相同但内容不同的记录照常输出，并作为冲突报告。
+#      每个标识只保留首次出现的文件与记录摘要。
+# 设置 max_keys / max_files 时，超出的标识与文件大小分组转存到 spill_dir 下的临时 SQLite。
+
+
+def _row_digest(row):
+    return hashlib.blake2b(repr(tuple(row)).encode("utf-8"), digest_size=16).digest()
+
+
+class Deduplicator:
+    def __init__(self, key_index=None, max_keys=None, spill_dir=None, max_files=None):
+        self.key_index = key_index
+        # 大小 -> [[相对路径, 路径, 内容哈希，None 为尚未计算，False 为无法读取], ...]
+        self._by_size = SpillMap(max_files, spill_dir)
+        # 标识的 repr -> (相对路径, 记录摘要)；按 repr 比较，内存与临时库中的判断一致
+        self._keys = SpillMap(max_keys, spill_dir)
+        self.duplicates = []
+        # 无法计算内容哈希、未做重复文件检查的文件
+        self.unchecked = []
+        self.duplicate_rows = 0
+        self.conflicts = {}
+
+    def duplicate_of(self, source):
+        # 返回内容相同的先前文件的相对路径，没有则返回 None（在解析前调用）
+        # 取出的分组可能来自临时库，计算过的哈希与新文件都要写回
+        same_size = self._by_size.get(source.size) or []
+        digest = None
+        if same_size:
+            try:
+                digest = file_digest(source.path)
+            except OSError as e:
+                self.unchecked.append({"file": source.rel_path, "error": str(e)})
+                return None
+            for entry in same_size:
+                if entry[2] is None:
+                    try:
+                        entry[2] = file_digest(entry[1])
+                    except OSError:
+                        entry[2] = False
+                if entry[2] == digest:
+                    self._by_size.put(source.size, same_size)
+                    self.duplicates.append({"file": source.rel_path, "duplicate_of": entry[0]})
+                    return entry[0]
+        same_size.append([source.rel_path, source.path, digest])
+        self._by_size.put(source.size, same_size)
+        return None
+
+    def filter_rows(self, rel_path, rows):
+        # 按标识列去掉重复记录并登记冲突，返回需要输出的记录
+        if self.key_index is None:
+            return rows
+        kept = []
+        for row in rows:
+            key = row[self.key_index]
+            if key is None or key == "":
+                kept.append(row)
+                continue
+            key_text = repr(key)
+            digest = _row_digest(row)
+            first = self._lookup(key_text)
+            if first is None:
+                self._remember(key_text, rel_path, digest)
+                kept.append(row)
+            elif first[1] == digest:
+                self.duplicate_rows += 1
+            else:
+                files = self.conflicts.setdefault(key, [first[0]])
+                if rel_path not in files:
+                    files.append(rel_path)
+                kept.append(row)
+        return kept
+
+    def filter_indexed(self, rel_path, rows, index):
+        # 增量合并：与增量索引中其他文件的同标识记录比对（去重标识列即增量合并的标识列）。
+        # 重复的记录保留原有文件中的一条；内容不同的记录按增量合并的规则以新文件为准，并作为冲突报告
+        if self.key_index is None:
+            return rows
+        kept = []
+        batch = {}
+        for row in rows:
+            key = row[self.key_index]
+            if key is None or key == "":
+                kept.append(row)
+                continue
+            key_text = str(key)
+            first = batch.get(key_text)
+            if first is None:
+                first = index.record(key_text, exclude=rel_path)
+            if first is None:
+                batch[key_text] = (rel_path, tuple(row))
+                kept.append(row)
+            elif first[1] == tuple(row):
+                self.duplicate_rows += 1
+            else:
+                files = self.conflicts.setdefault(key, [first[0]])
+                if rel_path not in files:
+                    files.append(rel_path)
+                kept.append(row)
+        return kept
+
+    def _lookup(self, key_text):
+        return self._keys.get(key_text)
+
+    def _remember(self, key_text, rel_path, digest):
+        self._keys.put(key_text, (rel_path, digest))
+
+    @property
+    def spilled_keys(self):
+        return self._keys.spilled
+
+    def close(self):
+        # 删除转存标识与文件大小分组的临时库
+        self._keys.close()
+        self._by_size.close()
+
+    def summary(self):
+        unchecked = f"，{len(self.unchecked)} 个文件无法读取、未检查是否重复" if self.unchecked else ""
+        return (f"跳过重复文件 {len(self.duplicates)} 个，重复记录 {self.duplicate_rows} 条，"
+                f"标识冲突 {len(self.conflicts)} 个{unchecked}")
+
+    def has_findings(self):
+        return bool(self.duplicates or self.duplicate_rows or self.conflicts or self.unchecked)
+
+    def to_dict(self):
+        return {
+            "duplicate_files": self.duplicates,
+            "unchecked_files": self.unchecked,
+            "duplicate_rows": self.duplicate_rows,
+            "conflicts": [{"key": str(key), "files": files} for key, files in self.conflicts.items()],
+        }
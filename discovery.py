@@ -0,0 +1,111 @@
+import os
+import queue
+import fnmatch
+import threading
+from collections import namedtuple
+from memory_budget import SpillQueue
+
+# 源文件发现：基于 os.scandir 逐目录惰性产出候选文件，可递归子目录，
+# 支持包含/排除通配符，跳过 Excel 锁文件、临时文件和空文件。
+
+EXCEL_EXTENSIONS = (".xlsx", ".xls")
+
+# rel_path 为相对源目录的路径（日志与状态显示用），path 为完整路径
+SourceFile = namedtuple("SourceFile", ["rel_path", "path", "size", "mtime_ns"])
+
+
+def is_temp_file(name):
+    # ~$xxx.xlsx 为 Excel 打开文件时的锁文件，.~ / ~xxx.tmp 为 WPS/Office 临时文件，. 开头为隐藏文件
+    return name.startswith(("~$", ".~", ".")) or name.lower().endswith(".tmp")
+
+
+def _match_any(rel_path, name, patterns):
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def iter_source_files(src_dir, recursive=False, include=None, exclude=None, extensions=EXCEL_EXTENSIONS,
+                      skip_dirs=(), sort=True):
+    # include/exclude 为通配符列表，同时匹配相对路径与文件名（如 "*崩塌*"、"备份/*"）
+    # sort=True 时每个目录内按名称排序，保证多次运行顺序一致；子目录在本目录文件之后处理
+    include = list(include or [])
+    exclude = list(exclude or [])
+    skip_dirs = {os.path.normcase(os.path.abspath(d)) for d in skip_dirs}
+    stack = [(src_dir, "")]
+    while stack:
+        current, rel_dir = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = list(it) if sort else it
+                if sort:
+                    entries.sort(key=lambda e: e.name)
+                sub_dirs = []
+                for entry in entries:
+                    name = entry.name
+                    rel_path = f"{rel_dir}{name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive and not name.startswith(".") \
+                                and os.path.normcase(os.path.abspath(entry.path)) not in skip_dirs \
+                                and not _match_any(rel_path, name, exclude):
+                            sub_dirs.append((entry.path, f"{rel_path}/"))
+                        continue
+                    if not name.lower().endswith(extensions) or is_temp_file(name):
+                        continue
+                    if include and not _match_any(rel_path, name, include):
+                        continue
+                    if exclude and _match_any(rel_path, name, exclude):
+                        continue
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if st.st_size == 0:
+                        continue
+                    yield SourceFile(rel_path, entry.path, st.st_size, st.st_mtime_ns)
+        except OSError:
+            if current == src_dir:
+                raise
+            continue
+        # 逆序入栈，使子目录按名称顺序处理
+        stack.extend(reversed(sub_dirs))
+
+
+class BackgroundDiscovery:
+    # 在后台线程中枚举文件，提取可以在枚举完成前开始；count 为目前已发现的文件数。
+    # 设置 max_queued 时待提取的文件在内存中最多保留这么多个，其余暂存到 spill_dir 下的临时文件
+    def __init__(self, source_iter, max_queued=None, spill_dir=None):
+        self.count = 0
+        self.total_bytes = 0
+        self.done = False
+        self._queue = SpillQueue(max_queued, spill_dir=spill_dir) if max_queued else queue.Queue()
+        self._error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(source_iter,), daemon=True)
+        self._thread.start()
+
+    def _run(self, source_iter):
+        try:
+            for item in source_iter:
+                if self._stop.is_set():
+                    break
+                self.count += 1
+                self.total_bytes += item.size
+                self._queue.put(item)
+        except Exception as e:
+            self._error = e
+        finally:
+            self.done = True
+            self._queue.put(None)
+
+    def stop(self):
+        self._stop.set()
+        if isinstance(self._queue, SpillQueue):
+            self._queue.close()
+
+    def __iter__(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            yield item
+        if self._error is not None:
+            raise self._error
@@ -1,71 +1,782 @@
+import io
 import os
 import time
-import pandas as pd
-import openpyxl
-from datetime import datetime
+import threading
+import itertools
+import json
+import sqlite3
+import cProfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import xlsx_reader
+from output_sinks import MultiSink, OUTPUT_FORMATS, build_output_path, check_formats
+from merge_index import MergeIndex
+from merge_journal import MergeJournal
+from isolated_pool import IsolatedPool
+from dedup import Deduplicator
+from prefetch import DEFAULT_PREFETCH_MB, DEFAULT_PREFETCH_WINDOW, is_network_path, prefetch
+from discovery import BackgroundDiscovery, iter_source_files
+from memory_budget import MemoryBudget
+from merge_metrics import MergeMetrics
+from throughput import ThroughputEstimator
+from extraction_plan import ExtractionPlan, compile_plan
+from template_fingerprint import TemplateRouter
+from column_types import ConversionErrors
+
+# 提取引擎（.xlsx）：fast 直接解析工作表 XML，nostyles 在此基础上不读取 styles.xml（日期按序列号输出），
+# openpyxl 加载完整工作簿；.xls 始终使用 xlrd
+ENGINES = ("fast", "nostyles", "openpyxl")
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+
+
+class XlsxBackend:
+    # 只解析所需工作表 XML 与共享字符串表，每个工作表一次顺序扫描
+    name = "fast"
+
+    @staticmethod
+    def read_sheets(f, requests, stats=None, layout=None):
+        return xlsx_reader.read_sheets(f, requests, stats, layout=layout)
+
+
+class NoStylesBackend:
+    # 不读取样式部件，适合样式表远大于数据、且不需要日期转换的表单
+    name = "nostyles"
+
+    @staticmethod
+    def read_sheets(f, requests, stats=None, layout=None):
+        return xlsx_reader.read_sheets(f, requests, stats, styles=False, layout=layout)
+
+
+class OpenpyxlBackend:
+    name = "openpyxl"
+
+    @staticmethod
+    def read_sheets(f, requests, stats=None, layout=None):
+        # openpyxl 导入较慢，只在需要时加载
+        import openpyxl
+        start = time.perf_counter()
+        wb = openpyxl.load_workbook(f, data_only=True)
+        names = wb.sheetnames
+        active_index = names.index(wb.active.title) if wb.active is not None else 0
+        results = []
+        cells = 0
+        dimensions = {}
+        for request in requests:
+            sheets = []
+            for index in request.select(names, active_index):
+                ws = wb[names[index]]
+                if not hasattr(ws, "cell"):
+                    sheets.append((names[index], {}))
+                    continue
+                if names[index] not in dimensions:
+                    dimensions[names[index]] = ws.dimensions
+                sheets.append((names[index], {(r, c): ws.cell(r, c).value for r, c in request.coords}))
+                cells += len(request.coords)
+            results.append(sheets)
+        if layout is not None:
+            layout["sheets"] = names
+            layout["dimensions"] = dimensions
+        _record_whole_file(stats, f, "openpyxl_load", start, cells)
+        return results
+
+
+class XlsBackend:
+    # 旧版 BIFF 格式（.xls），按需加载所需工作表，只读取配置的单元格
+    name = "xls"
+
+    @staticmethod
+    def read_sheets(f, requests, stats=None, layout=None):
+        try:
+            import xlrd
+        except ImportError:
+            raise ValueError("读取 .xls 文件需要安装 xlrd（pip install xlrd）")
+        start = time.perf_counter()
+        book = xlrd.open_workbook(file_contents=f.read(), on_demand=True)
+        results = []
+        cells = 0
+        dimensions = {}
+        try:
+            names = book.sheet_names()
+            # 确定活动工作表可能要逐个加载工作表，只在有请求使用活动工作表选择器时才做
+            active_index = 0
+            if any(request.selector.kind == "active" for request in requests):
+                active_index = XlsBackend._active_index(book)
+            for request in requests:
+                sheets = []
+                for index in request.select(names, active_index):
+                    sheet = book.sheet_by_index(index)
+                    if sheet.nrows and sheet.ncols:
+                        dimensions[names[index]] = f"A1:{xlsx_reader.column_letter(sheet.ncols)}{sheet.nrows}"
+                    sheets.append((names[index], {(r, c): XlsBackend._cell_value(book, sheet, r - 1, c - 1)
+                                                  for r, c in request.coords}))
+                    cells += len(request.coords)
+                results.append(sheets)
+        finally:
+            book.release_resources()
+        if layout is not None:
+            layout["sheets"] = names
+            layout["dimensions"] = dimensions
+        _record_whole_file(stats, f, "xls_load", start, cells)
+        return results
+
+    @staticmethod
+    def _active_index(book):
+        # Excel 保存时活动工作表同时带有 sheet_visible 与 sheet_selected 标记，部分软件只写后者
+        selected = None
+        for index in range(book.nsheets):
+            sheet = book.sheet_by_index(index)
+            visible, is_selected = sheet.sheet_visible, sheet.sheet_selected
+            book.unload_sheet(index)
+            if visible:
+                return index
+            if selected is None and is_selected:
+                selected = index
+        return selected or 0
+
+    @staticmethod
+    def _cell_value(book, sheet, row, col):
+        import xlrd
+        if row >= sheet.nrows or col >= sheet.row_len(row):
+            return None
+        cell = sheet.cell(row, col)
+        ctype, value = cell.ctype, cell.value
+        if ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+            return None
+        if ctype == xlrd.XL_CELL_NUMBER:
+            # 与 .xlsx 一致：整数值返回 int
+            return int(value) if value.is_integer() else value
+        if ctype == xlrd.XL_CELL_DATE:
+            dt = xlrd.xldate_as_datetime(value, book.datemode)
+            return dt.time() if 0 <= value < 1 else dt
+        if ctype == xlrd.XL_CELL_BOOLEAN:
+            return bool(value)
+        if ctype == xlrd.XL_CELL_ERROR:
+            return xlrd.error_text_from_code.get(value, "#ERR")
+        return value
+
+
+def _record_whole_file(stats, f, stage, start, cells):
+    # 整体加载工作簿的后端无法细分阶段，按整个文件记录
+    if stats is not None:
+        stats["stages"] = {stage: time.perf_counter() - start}
+        position = f.tell()
+        stats["bytes_read"] = f.seek(0, os.SEEK_END)
+        f.seek(position)
+        stats["cells"] = cells
+
+
+def select_backend(header, file_path, engine="fast"):
+    # 优先按文件头判断格式（扩展名与实际格式不符的文件很常见），无法识别时再看扩展名
+    if header.startswith(_ZIP_MAGIC):
+        return {"fast": XlsxBackend, "nostyles": NoStylesBackend}.get(engine, OpenpyxlBackend)
+    if header.startswith(_OLE2_MAGIC):
+        return XlsBackend
+    ext = os.path.splitext(file_path)[1].lower()
+    raise ValueError(f"无法识别的文件格式（{ext or '无扩展名'}），可能是网页或文本格式另存的表格")
+
+
+def extract_rows(file_path, plan, engine="fast", stats=None, data=None):
+    # 按提取计划读取单个文件，返回该文件产出的记录列表（在工作进程中执行）；
+    # data 为预读的文件内容，传入时不再读取磁盘
+    layout = {}
+    with (io.BytesIO(data) if data is not None else open(file_path, "rb")) as f:
+        backend = select_backend(f.read(8), file_path, engine)
+        f.seek(0)
+        sheet_values = backend.read_sheets(f, plan.requests, stats, layout)
+    rows = plan.build_rows(sheet_values, layout)
+    # 按模板指纹选用的配置（TemplateRouter）
+    if stats is not None and "template" in layout:
+        stats["template"] = layout["template"]
+    return rows
+
+
+def _safe_extract(file_path, plan, engine, retries=0, data=None, retry_delay=0.5):
+    # 异常在子进程内转成字符串，避免不可序列化的异常对象跨进程传递；
+    # 同时返回单文件统计（耗时、各阶段耗时、读取字节数、异常类型、尝试次数）供主进程汇总。
+    # 网络共享上的读取错误（OSError）多为暂时性的，按指数退避重试 retries 次
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        stats = {}
+        try:
+            rows, error = extract_rows(file_path, plan, engine, stats, data), None
+        except Exception as e:
+            rows, error = None, str(e)
+            stats["error_type"] = type(e).__name__
+            if isinstance(e, OSError) and not isinstance(e, FileNotFoundError) and attempt < retries:
+                time.sleep(retry_delay * 2 ** attempt)
+                continue
+        break
+    stats["attempts"] = attempt + 1
+    if data is not None:
+        stats["prefetched"] = True
+    stats["seconds"] = time.perf_counter() - start
+    return rows, error, stats
+
 
 class ExcelProcessor:
-    def __init__(self, src_dir, out_dir, config, logger=None):
+    def __init__(self, src_dir, out_dir, config, logger=None, workers=1, engine="fast", cache=None,
+                 executor=None, recursive=False, include=None, exclude=None, profile_path=None,
+                 output_formats=("xlsx",), upsert_key=None, file_timeout=None, retries=2, journal=True,
+                 checkpoint_every=50, prefetch=None, prefetch_mb=DEFAULT_PREFETCH_MB, dedup=False,
+                 dedup_key=None, templates=None, memory_mb=None, source_filter=None):
         self.src_dir = src_dir
         self.out_dir = out_dir
-        self.config = config
+        # config 可以是配置字典或已编译的 ExtractionPlan（如 ConfigManager.compile_config 的结果）；
+        # 在构造时编译，配置有误时合并开始前即报错
+        self.plan = config if isinstance(config, ExtractionPlan) else compile_plan(config)
+        # 模板指纹：主配置带有指纹或给出了候选配置（templates，已编译的 ExtractionPlan 列表）时，
+        # 每个文件先比对指纹，不符的文件报告为失败，或按指纹改用相符的候选配置
+        if self.plan.fingerprint is not None or templates:
+            self.plan = TemplateRouter(self.plan, templates or ())
+        self.config = self.plan.config
         self.logger = logger if logger else print
+        # 工作进程数，<=1 时在当前进程内逐个处理
+        self.workers = max(1, int(workers or 1))
+        if engine not in ENGINES:
+            raise ValueError(f"未知的提取引擎: {engine}")
+        self.engine = engine
+        # 可选的 ExtractCache，未变化的文件直接使用缓存结果
+        self.cache = cache
+        self._cache_error_logged = False
+        # 外部传入的进程池（多个任务共用），由调用方负责关闭
+        self.executor = executor
+        # 源文件发现：是否递归子目录，包含/排除的通配符列表
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        # 可选的 source_filter(SourceFile) -> bool，返回 False 的文件本次不处理（如监视模式下尚未写完的文件）
+        self.source_filter = source_filter
+        # 设置后本次合并在当前进程内提取，并把 cProfile 结果写入该路径
+        self.profile_path = profile_path
+        # 输出格式（xlsx/csv/parquet/sqlite），一次提取可同时写出多种
+        self.output_formats = check_formats(output_formats)
+        # 设置标识列（如 省级编号）后为增量模式：只提取新增或变化的文件，按标识追加或替换记录
+        self.upsert_key = upsert_key
+        # 单个文件的最长提取时间（秒），设置后在独立工作进程中提取，超时的进程被终止
+        self.file_timeout = file_timeout
+        # 暂时性读取错误的重试次数
+        self.retries = max(0, int(retries))
+        # 检查点：普通合并写入日志以便中断后继续，增量合并定期提交索引；每 checkpoint_every 个文件刷盘一次
+        self.use_journal = journal
+        self.checkpoint_every = max(1, int(checkpoint_every))
+        self.journal = None
+        # 预读的文件数：None 时源目录位于网络共享上才启用，0 为不预读；prefetch_mb 为预读缓冲上限
+        self.prefetch = prefetch
+        self.prefetch_mb = prefetch_mb
+        # 内存预算（MB）：限制待提取文件队列、预读缓冲、去重标识与文件大小分组、检查点索引与输出批次的大小，
+        # 超出部分暂存到输出目录下的临时文件；不含解释器与库本身的内存。None 时不限制
+        self.memory_budget = MemoryBudget(memory_mb) if memory_mb else None
+        if self.memory_budget:
+            self.prefetch_mb = min(prefetch_mb, self.memory_budget.prefetch_mb)
+        self.failures = []
+        self.error_report_path = None
+        # 去重：dedup 为 True 时跳过内容相同的源文件；dedup_key 为标识列，用于识别重复记录与冲突
+        self.dedup = dedup
+        self.dedup_key = dedup_key
+        if dedup_key is not None and dedup_key not in self.plan.header_names:
+            raise ValueError(f"标识列不在配置的表头中: {dedup_key}")
+        # 增量合并时重复记录按增量索引判断，索引只能按增量合并的标识列查找
+        if upsert_key is not None and dedup_key is not None and dedup_key != upsert_key:
+            raise ValueError(f"增量合并时去重标识列需与增量标识列相同（{dedup_key} / {upsert_key}）")
+        self.deduplicator = None
+        self.dedup_report_path = None
+        # 表头指定了类型时，每次合并的类型转换错误清单
+        self.conversion_errors = None
+        self.type_report_path = None
+        self.out_paths = []
+        self.metrics = None
+        # 取消/暂停控制，可由其他线程调用 cancel()/pause()/resume()
+        self._cancel_event = threading.Event()
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self.cancelled = False
+
+    def cancel(self):
+        self._cancel_event.set()
+        self._resume_event.set()
+
+    def pause(self):
+        self._resume_event.clear()
+
+    def resume(self):
+        self._resume_event.set()
+
+    def is_paused(self):
+        return not self._resume_event.is_set()
 
-    def merge_excels(self, progress_callback=None, status_callback=None):
-        start_time = time.time()
+    def discover(self):
+        # 惰性产出待处理的 SourceFile；递归时跳过位于源目录内的输出目录
+        sources = iter_source_files(self.src_dir, recursive=self.recursive, include=self.include,
+                                    exclude=self.exclude, skip_dirs=[self.out_dir])
+        if self.source_filter is None:
+            return sources
+        return (source for source in sources if self.source_filter(source))
 
-        file_list = [f for f in os.listdir(self.src_dir) if f.lower().endswith((".xlsx", ".xls"))]
-        total_files = len(file_list)
-        if total_files == 0:
+    def _background_discovery(self):
+        if self.memory_budget is None:
+            return BackgroundDiscovery(self.discover())
+        return BackgroundDiscovery(self.discover(), self.memory_budget.queued_sources, self.out_dir)
+
+    def _sink(self, folder_name, plan):
+        batch_size = self.memory_budget.batch_rows(len(plan.header_names)) if self.memory_budget else None
+        return MultiSink(self.out_dir, folder_name, self.output_formats, batch_size)
+
+    def _timed(self, iterable, stage):
+        # 统计等待上游产出（如后台枚举）所用时间
+        it = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            item = next(it, None)
+            self.metrics.add_stage(stage, time.perf_counter() - start)
+            if item is None:
+                return
+            yield item
+
+    def result_hash(self, plan):
+        # 缓存、检查点与增量索引的键；nostyles 引擎的日期取值不同，结果单独保存
+        if self.engine == "nostyles":
+            return f"{plan.config_hash}:nostyles"
+        return plan.config_hash
+
+    def iter_extracted(self, sources, plan):
+        # 按 sources 的顺序逐个产出 (相对路径, 记录列表, 错误信息, 单文件统计)；统计中 file_size 为源文件大小
+        if self.metrics is None:
+            self.metrics = MergeMetrics()
+        config_hash = self.result_hash(plan) if self.cache else None
+        executor = None if self.profile_path else self.executor
+        own_executor = executor is None and (self.workers > 1 or self.file_timeout) and not self.profile_path
+        if own_executor:
+            # 设置了超时时使用可单独终止工作进程的进程池
+            executor = IsolatedPool(self.workers, self.file_timeout) if self.file_timeout \
+                else ProcessPoolExecutor(max_workers=self.workers)
+        # 提交窗口有上限，按提交顺序取结果，保证输出行顺序与单进程一致
+        window = self.workers * 4 if executor else 1
+        pending = deque()
+        window_files = self.prefetch
+        if window_files is None:
+            window_files = DEFAULT_PREFETCH_WINDOW if is_network_path(self.src_dir) else 0
+        lookups = self._lookup_sources(sources, config_hash)
+        if window_files > 0:
+            # 后台线程提前读取需要解析的文件，读取与解析重叠
+            prefetched = prefetch(lookups, window_files, self.prefetch_mb)
+            lookups = self._timed(prefetched, "prefetch_wait")
+        else:
+            prefetched = None
+            lookups = ((source, info, None, None) for source, info, _ in lookups)
+        try:
+            for source, (journaled_rows, cached_rows, fingerprint, duplicate_of), data, release in lookups:
+                file_path = source.path
+                if duplicate_of is not None:
+                    future = Future()
+                    future.set_result(([], None, {"duplicate_of": duplicate_of}))
+                elif journaled_rows is not None:
+                    future = Future()
+                    future.set_result((journaled_rows, None, {"journaled": True}))
+                elif cached_rows is not None:
+                    future = Future()
+                    future.set_result((cached_rows, None, {"cached": True}))
+                elif executor:
+                    future = executor.submit(_safe_extract, file_path, plan, self.engine, self.retries, data)
+                else:
+                    future = Future()
+                    future.set_result(_safe_extract(file_path, plan, self.engine, self.retries, data))
+                if release is not None:
+                    # 预读的字节在任务完成前一直由提交窗口持有，完成后才从预读上限中释放
+                    data = None
+                    future.add_done_callback(release)
+                pending.append((source, fingerprint, future))
+                if len(pending) >= window:
+                    yield self._collect(pending.popleft(), config_hash)
+            while pending:
+                yield self._collect(pending.popleft(), config_hash)
+        finally:
+            if prefetched is not None:
+                prefetched.close()
+            if own_executor:
+                executor.shutdown(cancel_futures=True)
+            else:
+                for *_, future in pending:
+                    future.cancel()
+            if self.cache:
+                self._cache_call(self.cache.commit)
+
+    def _cache_call(self, method, *args):
+        # 提取缓存出错（如被其他任务长时间锁定）时记录日志并按未缓存处理，不影响合并
+        try:
+            return method(*args)
+        except sqlite3.Error as e:
+            if not self._cache_error_logged:
+                self._cache_error_logged = True
+                self.logger(f"提取缓存暂不可用，相关文件按未缓存处理: {e}")
+            return None
+
+    def _lookup_sources(self, sources, config_hash):
+        # 依次查询检查点与提取缓存，产出 (SourceFile, (检查点记录, 缓存记录, 文件指纹, 重复的文件), 是否需要解析)；
+        # 与先前文件内容相同的文件不再解析
+        for source in sources:
+            cached_rows, fingerprint = None, None
+            if self.deduplicator and self.dedup:
+                with self.metrics.timer("dedup_hash"):
+                    duplicate_of = self.deduplicator.duplicate_of(source)
+                if duplicate_of is not None:
+                    yield source, (None, None, None, duplicate_of), False
+                    continue
+            journaled_rows = self.journal.lookup(source) if self.journal else None
+            if journaled_rows is None and self.cache:
+                with self.metrics.timer("cache_lookup"):
+                    cached_rows, fingerprint = \
+                        self._cache_call(self.cache.lookup, source.path, config_hash) or (None, None)
+                if cached_rows is not None:
+                    fingerprint = None
+            wanted = journaled_rows is None and cached_rows is None
+            yield source, (journaled_rows, cached_rows, fingerprint, None), wanted
+
+    def _collect(self, entry, config_hash):
+        source, fingerprint, future = entry
+        file_name = source.rel_path
+        with self.metrics.timer("wait_results"):
+            try:
+                rows, error, stats = future.result()
+            except Exception as e:
+                # 工作进程超时或异常退出
+                rows, error, stats = None, str(e), {"error_type": type(e).__name__}
+        stats["file_size"] = source.size
+        self.metrics.record_file(file_name, stats, error)
+        if error is not None:
+            self.failures.append({"file": file_name, "error_type": stats.get("error_type", "Exception"),
+                                  "error": error, "attempts": stats.get("attempts", 1)})
+            return file_name, rows, error, stats
+        # fingerprint 不为空表示本次是实际解析的，写回缓存
+        if fingerprint is not None:
+            with self.metrics.timer("cache_store"):
+                self._cache_call(self.cache.store, source.path, config_hash, fingerprint, rows)
+        if self.journal and not stats.get("journaled") and not stats.get("duplicate_of"):
+            with self.metrics.timer("checkpoint"):
+                self.journal.append(source, rows)
+        return file_name, rows, error, stats
+
+    def _write_error_report(self, out_path):
+        # 失败文件清单（JSON）写在输出文件旁，便于程序化重试或汇总
+        if not self.failures:
+            return None
+        report_path = os.path.splitext(out_path)[0] + "_失败文件.json"
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"src_dir": os.path.abspath(self.src_dir), "failed": len(self.failures),
+                       "files": self.failures}, f, ensure_ascii=False, indent=4)
+        self.logger(f"{len(self.failures)} 个文件处理失败，清单已保存: {report_path}")
+        return report_path
+
+    def _write_dedup_report(self, out_path):
+        # 重复文件、重复记录与标识冲突清单（JSON），写在输出文件旁
+        if self.deduplicator is None:
+            return None
+        self.logger(self.deduplicator.summary())
+        if not self.deduplicator.has_findings():
+            return None
+        report_path = os.path.splitext(out_path)[0] + "_重复与冲突.json"
+        report = {"src_dir": os.path.abspath(self.src_dir), "key_column": self.dedup_key}
+        report.update(self.deduplicator.to_dict())
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4, default=str)
+        self.logger(f"重复与冲突清单已保存: {report_path}")
+        return report_path
+
+    def _write_type_report(self, out_path):
+        # 类型转换失败的单元格清单（JSON），这些单元格在输出中为空值
+        errors = self.conversion_errors
+        if errors is None or not errors.count:
+            return None
+        self.logger(errors.summary())
+        report_path = os.path.splitext(out_path)[0] + "_类型错误.json"
+        report = {"src_dir": os.path.abspath(self.src_dir)}
+        report.update(errors.to_dict())
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=4, default=str)
+        self.logger(f"类型转换错误清单已保存: {report_path}")
+        return report_path
+
+    def _convert_types(self, file_name, rows):
+        if self.conversion_errors is None:
+            return rows
+        with self.metrics.timer("convert_types"):
+            return self.plan.column_types.convert(rows, file_name, self.conversion_errors)
+
+    def merge_excels(self, progress_callback=None, status_callback=None, throughput_callback=None):
+        # 返回 (第一种格式的输出文件路径, 行数, MergeMetrics)，全部输出路径见 self.out_paths。
+        # status_callback(文件名, 已处理文件数, 文件总数, 预计剩余秒数)；
+        # 可选的 throughput_callback(吞吐量) 在每次 status_callback 之前调用，
+        # 吞吐量为 {"files_per_sec": 文件/秒, "mb_per_sec": MB/秒}
+        self.metrics = MergeMetrics()
+        self.metrics.memory_budget_mb = self.memory_budget.total_mb if self.memory_budget else None
+        self.failures = []
+        self.error_report_path = None
+        self.dedup_report_path = None
+        self.type_report_path = None
+        self.conversion_errors = ConversionErrors() if self.plan.column_types else None
+        self.deduplicator = None
+        if self.dedup or self.dedup_key:
+            key_index = self.plan.header_names.index(self.dedup_key) if self.dedup_key else None
+            if self.memory_budget:
+                self.deduplicator = Deduplicator(key_index, self.memory_budget.dedup_keys, self.out_dir,
+                                                 self.memory_budget.tracked_files)
+            else:
+                self.deduplicator = Deduplicator(key_index)
+        if isinstance(self.plan, TemplateRouter):
+            names = "、".join(name or "当前配置" for name in self.plan.names)
+            self.logger(f"按模板指纹检查文件，可选配置: {names}")
+            if self.plan.skipped:
+                self.logger(f"表头与当前配置不同、不参与模板匹配的配置: {'、'.join(self.plan.skipped)}")
+        merge = self._upsert if self.upsert_key else self._merge
+        profiler = cProfile.Profile() if self.profile_path else None
+        if profiler:
+            profiler.enable()
+        try:
+            return merge(progress_callback, status_callback, throughput_callback)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(self.profile_path)
+                self.logger(f"性能分析结果已保存: {self.profile_path}")
+            if self.deduplicator:
+                self.deduplicator.close()
+
+    def _merge(self, progress_callback, status_callback, throughput_callback):
+        metrics = self.metrics
+        plan = self.plan
+
+        # 后台线程惰性枚举源文件，提取在枚举完成前即可开始；目录内按名称排序，保证输出行顺序一致
+        discovery = self._background_discovery()
+        sources = self._timed(discovery, "discovery_wait")
+        first = next(sources, None)
+        if first is None:
             raise ValueError("源目录没有可处理的Excel文件")
 
-        merged_rows = []
         processed_files = 0
-        header_names = [h["name"] for h in self.config["headers"]]
+        throughput = ThroughputEstimator()
+        cache_hits, cache_misses = (self.cache.hits, self.cache.misses) if self.cache else (0, 0)
 
-        for file_name in file_list:
-            file_path = os.path.join(self.src_dir, file_name)
+        # 每提取一行立即写入输出，不在内存中累积全部结果
+        folder_name = os.path.basename(os.path.normpath(self.src_dir))
+        sink = self._sink(folder_name, plan)
+        with metrics.timer("output_open"):
+            sink.open(plan.header_names)
+        if self.use_journal:
             try:
-                wb = openpyxl.load_workbook(file_path, data_only=True)
-                ws = wb.active
-                row_data = []
-                for h in self.config["headers"]:
-                    cell_value = ws[h["cell"]].value
-                    row_data.append(cell_value)
-                merged_rows.append(row_data)
-            except Exception as e:
-                self.logger(f"文件 {file_name} 处理失败: {str(e)}")
-                continue
+                budget = self.memory_budget
+                self.journal = MergeJournal(self.journal_path(), self.src_dir, self.result_hash(plan),
+                                            self.checkpoint_every,
+                                            max_entries=budget.tracked_files if budget else None,
+                                            spill_dir=self.out_dir)
+            except BaseException:
+                sink.abort()
+                raise
+            if self.journal.entries:
+                self.logger(f"发现未完成的合并，{len(self.journal.entries)} 个文件将直接使用检查点中的结果")
+        extracted = self.iter_extracted(itertools.chain([first], sources), plan)
+        try:
+            for file_name, rows, error, stats in extracted:
+                # 枚举尚未完成时总数为目前已发现的文件数
+                total_files = discovery.count
+                if self.is_paused():
+                    paused_at = time.perf_counter()
+                    self._resume_event.wait()
+                    # 暂停的时间不计入处理速度
+                    throughput.exclude_time(time.perf_counter() - paused_at)
+                if self._cancel_event.is_set():
+                    # 取消后停止提取，已提取的行照常写出
+                    self.cancelled = True
+                    self.logger(f"合并已取消，已提取 {processed_files}/{total_files} 个文件")
+                    break
+                # 失败的文件同样计入已处理字节，剩余量按发现的文件总大小估计
+                throughput.update(stats.get("file_size", 0))
+                if error is not None:
+                    self.logger(f"文件 {file_name} 处理失败: {error}")
+                    continue
+                rows = self._convert_types(file_name, rows)
+                if self.deduplicator:
+                    rows = self.deduplicator.filter_rows(file_name, rows)
+                with metrics.timer("output_write"):
+                    for row in rows:
+                        sink.write_row(row)
 
-            processed_files += 1
-            percent = int(processed_files / total_files * 100)
-            if progress_callback:
-                progress_callback(percent)
+                processed_files += 1
+                percent = int(processed_files / total_files * 100)
+                if progress_callback:
+                    progress_callback(percent)
 
-            elapsed = time.time() - start_time
-            avg_time = elapsed / processed_files
-            remain_secs = (total_files - processed_files) * avg_time
+                if throughput_callback:
+                    throughput_callback(throughput.snapshot())
+                if status_callback:
+                    remain_secs = throughput.remaining_seconds(total_files, discovery.total_bytes)
+                    status_callback(file_name, processed_files, total_files, remain_secs)
+
+            extracted.close()
+            discovery.stop()
+            if self.cache:
+                self.logger(f"缓存命中 {self.cache.hits - cache_hits} 个文件，"
+                            f"重新解析 {self.cache.misses - cache_misses} 个文件")
+
+            with metrics.timer("output_close"):
+                self.out_paths = sink.close()
+        except BaseException:
+            discovery.stop()
+            extracted.close()
+            sink.abort()
+            if self.journal:
+                # 保留检查点，下次合并从中断处继续
+                self.journal.close()
+            raise
+        finally:
+            journal, self.journal = self.journal, None
+        if journal:
+            # 取消时保留检查点，下次合并可继续
+            journal.close(remove=not self.cancelled)
+        self.error_report_path = self._write_error_report(self.out_paths[0])
+        self.dedup_report_path = self._write_dedup_report(self.out_paths[0])
+        self.type_report_path = self._write_type_report(self.out_paths[0])
+        metrics.count("rows_written", sink.row_count)
+        metrics.finish()
+        self.logger(metrics.summary())
+        return self.out_paths[0], sink.row_count, metrics
+
+    def journal_path(self):
+        folder_name = os.path.basename(os.path.normpath(self.src_dir))
+        return os.path.join(self.out_dir, f".{folder_name}_集合.journal")
 
-            if status_callback:
-                status_callback(file_name, processed_files, total_files, remain_secs)
+    def index_path(self):
+        folder_name = os.path.basename(os.path.normpath(self.src_dir))
+        return os.path.join(self.out_dir, f".{folder_name}_集合.index.sqlite")
+
+    def _upsert(self, progress_callback, status_callback, throughput_callback):
+        # 增量合并：与索引比对后只提取新增或变化的文件，再由索引导出完整结果并替换上一次的输出文件
+        plan = self.plan
+        plan.check_key_column(self.upsert_key)
+        key_index = plan.header_names.index(self.upsert_key)
+        index = MergeIndex(self.index_path(), self.src_dir, self.result_hash(plan), self.upsert_key)
+        try:
+            if index.rebuilt:
+                self.logger("配置或标识列已变化，增量索引已清空，全部文件重新提取")
+            return self._upsert_with(index, plan, key_index, progress_callback, status_callback,
+                                     throughput_callback)
+        finally:
+            index.close()
+
+    def _upsert_with(self, index, plan, key_index, progress_callback, status_callback, throughput_callback):
+        metrics = self.metrics
+        discovery = self._background_discovery()
+        # 跳过的未变化文件数与其字节数，不计入进度与剩余时间
+        skipped = [0, 0]
+        changed = {}
+
+        def changed_sources():
+            # 未变化的文件直接跳过，不进入提取
+            for source in self._timed(discovery, "discovery_wait"):
+                if index.is_current(source):
+                    skipped[0] += 1
+                    skipped[1] += source.size
+                    continue
+                changed[source.rel_path] = source
+                yield source
+
+        processed_files = 0
+        updated_files = 0
+        replaced_rows = 0
+        throughput = ThroughputEstimator()
+        extracted = self.iter_extracted(changed_sources(), plan)
+        try:
+            for file_name, rows, error, stats in extracted:
+                total_files = discovery.count - skipped[0]
+                if self.is_paused():
+                    paused_at = time.perf_counter()
+                    self._resume_event.wait()
+                    throughput.exclude_time(time.perf_counter() - paused_at)
+                if self._cancel_event.is_set():
+                    # 已更新的文件保留在索引中，下次合并从未完成的文件继续
+                    self.cancelled = True
+                    self.logger(f"合并已取消，已更新 {updated_files}/{total_files} 个文件")
+                    break
+                throughput.update(stats.get("file_size", 0))
+                processed_files += 1
+                source = changed.pop(file_name)
+                if error is not None:
+                    # 失败的文件保留原有记录，下次合并时重试
+                    self.logger(f"文件 {file_name} 处理失败: {error}")
+                else:
+                    rows = self._convert_types(file_name, rows)
+                    if self.deduplicator:
+                        rows = self.deduplicator.filter_indexed(file_name, rows, index)
+                    with metrics.timer("index_update"):
+                        replaced_rows += index.replace_source(source, rows, key_index)
+                    updated_files += 1
+                    # 定期提交，中断后已更新的文件不必重新提取
+                    if updated_files % self.checkpoint_every == 0:
+                        with metrics.timer("checkpoint"):
+                            index.commit()
+                if progress_callback:
+                    progress_callback(int(processed_files / max(total_files, 1) * 100))
+                if throughput_callback:
+                    throughput_callback(throughput.snapshot())
+                if status_callback:
+                    remain_secs = throughput.remaining_seconds(total_files, discovery.total_bytes - skipped[1])
+                    status_callback(file_name, processed_files, total_files, remain_secs)
+        finally:
+            discovery.stop()
+            extracted.close()
+            index.commit()
+        metrics.count("files_unchanged", skipped[0])
+        if discovery.count == 0:
+            raise ValueError("源目录没有可处理的Excel文件")
+        self.logger(f"增量合并：未变化 {skipped[0]} 个文件，更新 {updated_files} 个文件，"
+                    f"按标识替换 {replaced_rows} 条记录")
+        if progress_callback:
+            progress_callback(100)
 
-        # 生成 DataFrame
-        result_df = pd.DataFrame(merged_rows, columns=header_names)
+        row_count = index.row_count
+        previous = index.out_paths
+        expected_exts = {os.path.splitext(p)[1] for p in previous if os.path.exists(p)}
+        if updated_files == 0 and expected_exts == {OUTPUT_FORMATS[f].ext for f in self.output_formats}:
+            # 没有任何变化且输出文件齐全，沿用上一次的输出
+            self.out_paths = [p for p in previous if os.path.exists(p)]
+            self.logger("没有新增或变化的文件，输出文件保持不变")
+        else:
+            self.out_paths = self._export_index(index, plan, row_count, previous)
+            index.set_out_paths(self.out_paths)
+        self.error_report_path = self._write_error_report(self.out_paths[0])
+        self.dedup_report_path = self._write_dedup_report(self.out_paths[0])
+        self.type_report_path = self._write_type_report(self.out_paths[0])
+        metrics.count("rows_written", row_count)
+        metrics.finish()
+        self.logger(metrics.summary())
+        return self.out_paths[0], row_count, metrics
 
-        # ===================== 文件命名规则 =====================
-        # 1. 获取源目录最后一级文件夹名
+    def _export_index(self, index, plan, row_count, previous):
+        # 导出索引中的全部记录，写完后删除上一次的输出，并尽量使用不带时间后缀的文件名
+        metrics = self.metrics
         folder_name = os.path.basename(os.path.normpath(self.src_dir))
-        # 2. 数据行数
-        row_count = len(result_df)
-        # 3. 组合基础文件名
-        base_filename = f"{folder_name}_集合_{row_count}条.xlsx"
-        out_path = os.path.join(self.out_dir, base_filename)
-        # 4. 检查是否冲突（已有同名文件），冲突则加时间后缀
-        if os.path.exists(out_path):
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            base_filename = f"{folder_name}_集合_{row_count}条_{timestamp}.xlsx"
-            out_path = os.path.join(self.out_dir, base_filename)
-        # =======================================================
-
-        result_df.to_excel(out_path, index=False)
-        return out_path, len(result_df)
\ No newline at end of file
+        sink = self._sink(folder_name, plan)
+        try:
+            with metrics.timer("output_open"):
+                sink.open(plan.header_names)
+            with metrics.timer("output_write"):
+                for row in index.iter_rows():
+                    sink.write_row(row)
+            with metrics.timer("output_close"):
+                out_paths = sink.close()
+        except BaseException:
+            sink.abort()
+            raise
+        for path in previous:
+            if path not in out_paths and os.path.exists(path):
+                os.remove(path)
+        final_paths = []
+        for path in out_paths:
+            ext = os.path.splitext(path)[1]
+            target = build_output_path(self.out_dir, folder_name, row_count, ext)
+            if os.path.basename(path) != f"{folder_name}_集合_{row_count}条{ext}" \
+                    and os.path.basename(target) == f"{folder_name}_集合_{row_count}条{ext}":
+                os.replace(path, target)
+                path = target
+            final_paths.append(path)
+        return final_paths
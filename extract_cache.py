@@ -0,0 +1,125 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+
+# 提取结果缓存：以 (文件路径, 配置哈希) 为键，文件大小与修改时间判断是否变化。
+# 影响提取结果的配置项变化后哈希随之变化，旧记录自动失效。每个文件最多保留最近使用的
+# MAX_CONFIGS_PER_FILE 个配置哈希的记录（同一目录可由多个配置分别合并），更早的在写入新结果时删除；
+# 打开缓存时删除超过 max_age_days 天未使用的记录（已删除或不再合并的文件）。缓存文件因此不随配置修改
+# 持续增长（删除后空出的页由后续写入复用）。每个文件缓存其产出的全部记录。
+
+CACHE_VERSION = 3
+DEFAULT_MAX_AGE_DAYS = 30
+MAX_CONFIGS_PER_FILE = 4
+# 命中时最多每隔这么久更新一次使用时间，避免每次命中都写库
+_TOUCH_INTERVAL = 86400
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ExtractCache:
+    # 多个任务可各自打开同一个缓存文件（如任务队列中同时运行的任务），写入时最多等待 busy_timeout 秒；
+    # 此时应设 commit_every=1，避免长时间占用写锁
+    def __init__(self, db_path, commit_every=200, busy_timeout=30.0, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=busy_timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != CACHE_VERSION:
+            self.conn.execute("DROP TABLE IF EXISTS extract_cache")
+            self.conn.execute(f"PRAGMA user_version={CACHE_VERSION}")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS extract_cache ("
+            " path TEXT NOT NULL,"
+            " config_hash TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " rows BLOB NOT NULL,"
+            " PRIMARY KEY (path, config_hash))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extract_cache_last_used ON extract_cache (last_used)")
+        self.conn.commit()
+        self.pruned = 0
+        if max_age_days:
+            try:
+                self.pruned = self.prune(max_age_days)
+            except sqlite3.OperationalError:
+                # 其他任务正占用写锁时跳过清理，下次打开再清理
+                pass
+
+    def lookup(self, file_path, config_hash):
+        # 返回 (缓存的记录列表或 None, 文件指纹)；指纹在提取前获取，供 store 使用。
+        # 文件已被移动或删除等无法读取时按未命中返回 (None, None)，由提取过程报告该文件失败
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            self.misses += 1
+            return None, None
+        fingerprint = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        path = os.path.abspath(file_path)
+        record = self.conn.execute(
+            "SELECT size, mtime_ns, last_used, rows FROM extract_cache WHERE path=? AND config_hash=?",
+            (path, config_hash)).fetchone()
+        if record is not None and record[0] == st.st_size and record[1] == st.st_mtime_ns:
+            self.hits += 1
+            now = time.time()
+            if now - record[2] >= _TOUCH_INTERVAL:
+                self.conn.execute("UPDATE extract_cache SET last_used=? WHERE path=? AND config_hash=?",
+                                  (now, path, config_hash))
+                self._written()
+            return pickle.loads(record[3]), fingerprint
+        self.misses += 1
+        return None, fingerprint
+
+    def store(self, file_path, config_hash, fingerprint, rows):
+        path = os.path.abspath(file_path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO extract_cache (path, config_hash, size, mtime_ns, last_used, rows)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (path, config_hash, fingerprint["size"], fingerprint["mtime_ns"], time.time(),
+             pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)))
+        # 同一文件超出数量的旧配置哈希记录（配置修改前的结果）一并删除
+        self.conn.execute(
+            "DELETE FROM extract_cache WHERE path=? AND config_hash NOT IN ("
+            " SELECT config_hash FROM extract_cache WHERE path=? ORDER BY last_used DESC LIMIT ?)",
+            (path, path, MAX_CONFIGS_PER_FILE))
+        self._written()
+
+    def _written(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def prune(self, max_age_days):
+        # 删除超过 max_age_days 天未使用的记录，返回删除的条数
+        cursor = self.conn.execute("DELETE FROM extract_cache WHERE last_used < ?",
+                                   (time.time() - max_age_days * 86400,))
+        self.commit()
+        return cursor.rowcount
+
+    def commit(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def clear(self):
+        self.conn.execute("DELETE FROM extract_cache")
+        self.commit()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
@@ -0,0 +1,271 @@
+import re
+import json
+import hashlib
+from xlsx_reader import parse_cell
+from template_fingerprint import TemplateFingerprint
+from column_types import ColumnTypes, compile_type
+
+# 把配置编译为提取计划：按工作表分组、按行排序的单元格坐标，每个工作表只需一次顺序扫描。
+# 配置在原有 {"headers": [{"name", "cell"}]} 基础上支持以下可选项：
+#   "sheet":     默认工作表选择器，工作表名、序号（从 0 开始）或 {"regex": "..."}，缺省为活动工作表
+#   "per_sheet": true 时每个匹配的工作表产出一条记录
+#   "repeat":    {"step": 行间隔, "count": 最多区块数}，表头单元格为第一个区块，向下每隔 step 行重复，
+#                遇到整块为空即停止
+#   表头的 "cell" 可以是单行或单列区域（如 "B10:B50"），第 i 条记录取区域中的第 i 个单元格；
+#   表头可单独指定 "sheet"，该表头每个文件只取一个值，应用到同一文件的所有记录
+#   表头可指定 "type"（int/float/date/enum/regex 等，见 column_types.py），写出前按列转换类型
+#   "fingerprint": 模板指纹（工作表名、尺寸、锚点标签），见 template_fingerprint.py；不影响提取结果
+
+DEFAULT_REPEAT_COUNT = 100
+# 工作表的最大行数，repeat 的全部区块须在此范围内
+MAX_SHEET_ROWS = 1048576
+
+# 决定提取结果的配置项
+EXTRACTION_KEYS = ("headers", "sheet", "per_sheet", "repeat")
+
+
+def config_hash(config):
+    # 影响提取结果的配置项（表头、单元格、工作表选择、重复区块）的稳定哈希，配置变化时提取缓存随之失效
+    payload = {key: config.get(key) for key in EXTRACTION_KEYS}
+    payload = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SheetSelector:
+    def __init__(self, spec=None):
+        # spec: None/"active"、工作表名、序号，或 {"name"/"index"/"regex": ...}
+        self.spec = spec
+        self.kind, self.value = self._parse(spec)
+        self._regex = re.compile(self.value) if self.kind == "regex" else None
+
+    @staticmethod
+    def _parse(spec):
+        if spec is None or spec == "active":
+            return "active", None
+        if isinstance(spec, bool):
+            raise ValueError(f"无效的工作表选择器: {spec}")
+        if isinstance(spec, int):
+            return "index", spec
+        if isinstance(spec, str):
+            return "name", spec
+        if isinstance(spec, dict) and len(spec) == 1:
+            kind, value = next(iter(spec.items()))
+            if kind == "index" and isinstance(value, int) and not isinstance(value, bool):
+                return kind, value
+            if kind in ("name", "regex") and isinstance(value, str):
+                if kind == "regex":
+                    try:
+                        re.compile(value)
+                    except re.error as e:
+                        raise ValueError(f"工作表正则表达式无效: {value}（{e}）")
+                return kind, value
+        raise ValueError(f"无效的工作表选择器: {spec}")
+
+    @property
+    def key(self):
+        return self.kind, self.value
+
+    def select(self, sheet_names, active_index):
+        # 返回匹配的工作表序号列表（按工作簿中的顺序）
+        if self.kind == "active":
+            return [active_index]
+        if self.kind == "index":
+            return [self.value] if 0 <= self.value < len(sheet_names) else []
+        if self.kind == "name":
+            return [i for i, name in enumerate(sheet_names) if name == self.value][:1]
+        return [i for i, name in enumerate(sheet_names) if self._regex.search(name)]
+
+    def __reduce__(self):
+        return SheetSelector, (self.spec,)
+
+
+class SheetRequest:
+    # 一个工作表选择器下需要读取的全部单元格；multi 为 True 时返回所有匹配的工作表
+    def __init__(self, selector, coords, multi=False):
+        self.selector = selector
+        self.coords = sorted(set(coords))
+        self.targets = set(self.coords)
+        self.max_row = max((r for r, _ in self.coords), default=0)
+        self.max_col = max((c for _, c in self.coords), default=0)
+        self.multi = multi
+
+    def select(self, sheet_names, active_index):
+        indices = self.selector.select(sheet_names, active_index)
+        return indices if self.multi else indices[:1]
+
+
+def _parse_range(ref):
+    # 返回该表头在一个区块内的坐标列表：单元格为 1 个，区域为按行（或列）展开的多个
+    text = str(ref).strip()
+    if ":" not in text:
+        return [parse_cell(text)], False
+    start, end = (parse_cell(part) for part in text.split(":", 1))
+    (r1, c1), (r2, c2) = start, end
+    r1, r2 = sorted((r1, r2))
+    c1, c2 = sorted((c1, c2))
+    if r1 != r2 and c1 != c2:
+        raise ValueError(f"单元格区域只能是单行或单列: {ref}")
+    if r1 == r2:
+        return [(r1, c) for c in range(c1, c2 + 1)], True
+    return [(r, c1) for r in range(r1, r2 + 1)], True
+
+
+class ExtractionPlan:
+    # 配置的编译结果：表头名、按工作表分组的坐标、每列的取值方式，以及配置哈希。
+    # 所有表头的错误一次性收集后报告，合并开始前即可发现全部问题
+    def __init__(self, config, name=None):
+        if not isinstance(config, dict):
+            raise ValueError("配置格式错误：应为 JSON 对象")
+        headers = config.get("headers", [])
+        if not isinstance(headers, list):
+            raise ValueError("配置格式错误：headers 应为列表")
+        if not headers:
+            raise ValueError("配置中没有表头")
+        self.config = config
+        self.config_hash = config_hash(config)
+        # 配置名（配置文件名，不含扩展名），用于日志与模板匹配报告
+        self.name = name
+        errors = []
+        self.fingerprint = None
+        if config.get("fingerprint"):
+            try:
+                self.fingerprint = TemplateFingerprint(config["fingerprint"])
+            except ValueError as e:
+                errors.append(f"模板指纹: {e}")
+        self.per_sheet = bool(config.get("per_sheet", False))
+        main_selector = SheetSelector(config.get("sheet"))
+
+        repeat = config.get("repeat")
+        self.repeat_step = self.repeat_count = None
+        if repeat is not None and not isinstance(repeat, dict):
+            raise ValueError('repeat 应为 {"step": 行间隔, "count": 最多区块数} 对象')
+        if repeat:
+            step, count = repeat.get("step"), repeat.get("count", DEFAULT_REPEAT_COUNT)
+            if not isinstance(step, int) or isinstance(step, bool) or step <= 0:
+                raise ValueError(f"repeat.step 必须是正整数: {step}")
+            if not isinstance(count, int) or isinstance(count, bool) or count <= 0:
+                raise ValueError(f"repeat.count 必须是正整数: {count}")
+            if (count - 1) * step >= MAX_SHEET_ROWS:
+                raise ValueError(f"repeat 的 {count} 个区块超出工作表的最大行数（{MAX_SHEET_ROWS}）")
+            self.repeat_step, self.repeat_count = step, count
+
+        # columns[i] = (工作表选择器键, 一个区块内的坐标列表, 是否逐条记录取值)
+        self.header_names = []
+        self.columns = []
+        type_specs = {}
+        selectors = {main_selector.key: (main_selector, [])}
+        record_len = None
+        for i, h in enumerate(headers, 1):
+            name = h.get("name") if isinstance(h, dict) else None
+            name = name.strip() if isinstance(name, str) else ""
+            try:
+                if not isinstance(h, dict):
+                    raise ValueError('表头应为 {"name": 表头名, "cell": 单元格} 对象')
+                if h.get("name") is not None and not isinstance(h["name"], str):
+                    raise ValueError(f"表头名应为文本: {h['name']}")
+                if not name:
+                    raise ValueError("表头名为空")
+                if not str(h.get("cell") or "").strip():
+                    raise ValueError("单元格位置为空")
+                coords, is_range = _parse_range(h["cell"])
+                # 单独指定了工作表的表头每个文件只取一个值，应用到该文件的所有记录
+                explicit = "sheet" in h
+                selector = SheetSelector(h["sheet"]) if explicit else main_selector
+                if is_range:
+                    if explicit:
+                        raise ValueError("单独指定工作表的表头不能使用区域")
+                    if self.repeat_step:
+                        raise ValueError("区域与 repeat 不能同时使用")
+                    if record_len is not None and len(coords) != record_len:
+                        raise ValueError("所有区域的单元格数量必须相同")
+                    record_len = len(coords)
+                elif self.repeat_step and not explicit:
+                    (r, c), = coords
+                    coords = [(r + k * self.repeat_step, c) for k in range(self.repeat_count)]
+                if h.get("type") is not None:
+                    compile_type(h["type"])
+            except ValueError as e:
+                errors.append(f"第 {i} 行表头 {name or '（未命名）'}: {e}")
+                continue
+            selectors.setdefault(selector.key, (selector, []))[1].extend(coords)
+            per_record = not explicit and (is_range or bool(self.repeat_step))
+            if h.get("type") is not None:
+                type_specs[len(self.header_names)] = h["type"]
+            self.header_names.append(h["name"])
+            self.columns.append((selector.key, coords, per_record))
+        if errors:
+            raise ValueError("配置无效：\n" + "\n".join(errors))
+        self.column_types = ColumnTypes(self.header_names, type_specs) if type_specs else None
+
+        # per_record_mode: 区域或 repeat，每个工作表产出多条记录
+        self.per_record_mode = bool(record_len or self.repeat_step)
+        self.multi_record = self.per_record_mode or self.per_sheet
+        self.record_count = record_len or self.repeat_count or 1
+        self.main_key = main_selector.key
+        self.main_selector = main_selector
+        self.request_keys = list(selectors)
+        self.requests = [SheetRequest(sel, coords, multi=(key == self.main_key and self.per_sheet))
+                         for key, (sel, coords) in selectors.items()]
+        self.cells = [h["cell"] for h in headers]
+        # 逐条记录取值的列：多记录配置下只有这些列能区分同一文件的各条记录
+        if not self.multi_record:
+            self.record_key_columns = list(self.header_names)
+        else:
+            self.record_key_columns = [
+                name for name, (key, _, per_record) in zip(self.header_names, self.columns)
+                if per_record or (key == self.main_key and not self.per_record_mode)]
+
+    @property
+    def default_key_column(self):
+        # 增量合并的缺省标识列：配置的 key_column，否则为第一个逐条记录取值的列
+        return self.config.get("key_column") or (self.record_key_columns or self.header_names)[0]
+
+    def check_key_column(self, name):
+        # 增量合并的标识列须在表头中；多记录配置下须逐条记录取值，否则同一文件的记录会按标识互相覆盖
+        if name not in self.header_names:
+            raise ValueError(f"标识列不在配置的表头中: {name}")
+        if name not in self.record_key_columns:
+            raise ValueError(f"标识列 {name} 每个文件或工作表只取一个值，不能区分同一文件的多条记录"
+                             f"（可用: {', '.join(self.record_key_columns) or '无'}）")
+
+    def main_request(self, coords):
+        # 在主工作表上读取额外单元格（如模板锚点）的请求
+        return SheetRequest(self.main_selector, coords)
+
+    def build_rows(self, sheet_values, layout=None):
+        # sheet_values 与 requests 一一对应，每项为 [(工作表名, {坐标: 值}), ...]；layout 供 TemplateRouter 使用
+        results = dict(zip(self.request_keys, sheet_values))
+        main_sheets = results.get(self.main_key) or []
+        if not main_sheets:
+            raise ValueError("未找到配置指定的工作表")
+        fixed = {}
+        for key, sheets in results.items():
+            if key != self.main_key:
+                fixed[key] = sheets[0][1] if sheets else {}
+
+        rows = []
+        for _, values in main_sheets:
+            for k in range(self.record_count):
+                row = []
+                own_values = []
+                for key, coords, per_record in self.columns:
+                    source = values if key == self.main_key else fixed[key]
+                    if per_record:
+                        value = source.get(coords[k])
+                        own_values.append(value)
+                    else:
+                        value = source.get(coords[0])
+                        if key == self.main_key and not self.per_record_mode:
+                            own_values.append(value)
+                    row.append(value)
+                if self.multi_record and all(v is None or v == "" for v in own_values):
+                    # repeat 区块遇到空块即停止；区域与按工作表模式跳过空记录
+                    if self.repeat_step:
+                        break
+                    continue
+                rows.append(row)
+        return rows
+
+
+def compile_plan(config, name=None):
+    return ExtractionPlan(config, name)
@@ -0,0 +1,163 @@
+import time
+import signal
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing.connection import wait
+
+# 带单任务超时的进程池：每个工作进程同一时间只执行一个任务，超时或异常退出的进程被直接终止并重新创建，
+# 不会因为个别损坏或超大的工作簿卡住整个合并。接口与 ProcessPoolExecutor 的 submit/shutdown 一致。
+
+
+class FileTimeoutError(Exception):
+    pass
+
+
+class WorkerCrashedError(Exception):
+    pass
+
+
+def _worker_main(conn):
+    # Ctrl+C 由主进程处理（取消合并并关闭进程池），工作进程忽略，避免每个进程各打印一次 KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        fn, args = task
+        try:
+            conn.send((True, fn(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.future = None
+        self.deadline = None
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join(5)
+        self.conn.close()
+
+
+class IsolatedPool:
+    def __init__(self, max_workers=1, timeout=None):
+        self.max_workers = max(1, max_workers)
+        # 单个任务的最长执行时间（秒），None 表示不限
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context()
+        self._tasks = deque()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._abort = False
+        self._wake_r, self._wake_w = self._ctx.Pipe(duplex=False)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("进程池已关闭")
+            self._tasks.append((future, fn, args))
+        self._wake()
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                # 取消时不再等待正在执行的任务，直接终止其工作进程
+                self._abort = True
+                while self._tasks:
+                    self._tasks.popleft()[0].cancel()
+        self._wake()
+        if wait:
+            self._thread.join()
+
+    def _wake(self):
+        try:
+            self._wake_w.send_bytes(b"")
+        except OSError:
+            pass
+
+    def _assign(self):
+        with self._lock:
+            for worker in self._workers:
+                if worker.future is None:
+                    self._start_task(worker)
+            while self._tasks and len(self._workers) < self.max_workers:
+                worker = _Worker(self._ctx)
+                self._workers.append(worker)
+                self._start_task(worker)
+            if self._abort:
+                return True
+            return self._shutdown and not self._tasks and all(w.future is None for w in self._workers)
+
+    def _start_task(self, worker):
+        # 跳过已取消的任务
+        while self._tasks:
+            future, fn, args = self._tasks.popleft()
+            if future.set_running_or_notify_cancel():
+                worker.conn.send((fn, args))
+                worker.future = future
+                worker.deadline = time.monotonic() + self.timeout if self.timeout else None
+                return
+
+    def _replace(self, worker, error):
+        worker.kill()
+        worker.future.set_exception(error)
+        self._workers.remove(worker)
+
+    def _run(self):
+        while not self._assign():
+            busy = [w for w in self._workers if w.future is not None]
+            deadlines = [w.deadline for w in busy if w.deadline is not None]
+            wait_for = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            ready = wait([w.conn for w in busy] + [self._wake_r], wait_for)
+            for conn in ready:
+                if conn is self._wake_r:
+                    while self._wake_r.poll():
+                        self._wake_r.recv_bytes()
+                    continue
+                worker = next(w for w in busy if w.conn is conn)
+                try:
+                    ok, value = conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join(5)
+                    self._replace(worker, WorkerCrashedError(
+                        f"工作进程异常退出（退出码 {worker.process.exitcode}）"))
+                    continue
+                future, worker.future, worker.deadline = worker.future, None, None
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(WorkerCrashedError(value))
+            now = time.monotonic()
+            for worker in [w for w in busy if w.future is not None and w.deadline and w.deadline <= now]:
+                self._replace(worker, FileTimeoutError(f"处理超时（超过 {self.timeout} 秒）"))
+        for worker in list(self._workers):
+            if worker.future is not None:
+                self._replace(worker, WorkerCrashedError("进程池已关闭"))
+                continue
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self._workers:
+            worker.process.join(5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+        self._workers = []
@@ -0,0 +1,194 @@
+import os
+import time
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from excel_processor import ExcelProcessor
+from extract_cache import ExtractCache
+from isolated_pool import IsolatedPool
+
+# 多目录合并任务队列：每个任务为 (源目录, 配置, 输出目录)，所有任务共用一个提取进程池，
+# 同时运行的任务数有上限，每个任务完成即写出自己的结果。界面与命令行共用，回调在任务线程中调用。
+# 源目录名相同且输出目录相同的任务（输出文件名与检查点会冲突）不会同时运行。
+
+QUEUED = "等待"
+RUNNING = "运行中"
+DONE = "完成"
+FAILED = "失败"
+CANCELLED = "已取消"
+
+
+class MergeJob:
+    _ids = itertools.count(1)
+
+    def __init__(self, src_dir, config, out_dir, label=None, config_name=None, **options):
+        # config 为配置字典或已编译的 ExtractionPlan；options 为传给 ExcelProcessor 的其他参数
+        self.id = next(MergeJob._ids)
+        self.src_dir = src_dir
+        self.config = config
+        self.config_name = config_name
+        self.out_dir = out_dir
+        self.label = label or os.path.basename(os.path.normpath(src_dir))
+        self.options = options
+        self.state = QUEUED
+        self.percent = 0
+        # 最近的吞吐量 {"files_per_sec", "mb_per_sec"}，开始处理文件前为 None
+        self.throughput = None
+        self.out_paths = []
+        self.rows = 0
+        self.error = None
+        self.metrics = None
+        self.elapsed = None
+        self.processor = None
+        self.cancel_requested = False
+
+    @property
+    def output_key(self):
+        return (os.path.normcase(os.path.abspath(self.out_dir)),
+                os.path.basename(os.path.normpath(self.src_dir)))
+
+
+class JobQueue:
+    def __init__(self, workers=1, max_concurrent=2, engine="fast", cache_path=None, file_timeout=None,
+                 logger=None, on_progress=None, on_status=None, on_job_finished=None, on_all_finished=None):
+        self.workers = max(1, int(workers or 1))
+        self.max_concurrent = max(1, int(max_concurrent or 1))
+        self.engine = engine
+        self.cache_path = cache_path
+        self.file_timeout = file_timeout
+        self.logger = logger if logger else print
+        # 回调：on_progress(任务, 百分比)、on_status(任务, 文件名, 已处理, 总数, 剩余秒数)、
+        # on_job_finished(任务)、on_all_finished()；最近的吞吐量见任务的 throughput
+        self.on_progress = on_progress
+        self.on_status = on_status
+        self.on_job_finished = on_job_finished
+        self.on_all_finished = on_all_finished
+        self.jobs = []
+        self._pending = deque()
+        self._running_keys = set()
+        self._runners = 0
+        self._started = False
+        self._executor = None
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def add(self, job):
+        with self._lock:
+            self.jobs.append(job)
+            self._pending.append(job)
+            if self._started:
+                self._spawn_runners()
+        return job
+
+    def start(self):
+        with self._lock:
+            self._started = True
+            self._spawn_runners()
+
+    def cancel(self, job=None):
+        # 取消指定任务，job 为 None 时取消全部；等待中的任务直接标记为已取消
+        with self._lock:
+            targets = [job] if job is not None else list(self.jobs)
+            for j in targets:
+                j.cancel_requested = True
+                if j.state == QUEUED and j in self._pending:
+                    self._pending.remove(j)
+                    j.state = CANCELLED
+                elif j.state == RUNNING and j.processor is not None:
+                    j.processor.cancel()
+
+    def wait(self):
+        # 等待所有已加入的任务结束
+        with self._idle:
+            while self._runners or (self._started and self._pending):
+                self._idle.wait()
+
+    @property
+    def running(self):
+        return self._runners > 0
+
+    def _spawn_runners(self):
+        # 调用方持有锁
+        while self._runners < min(self.max_concurrent, self._runners + len(self._pending)):
+            if self._executor is None:
+                self._executor = self._create_executor()
+            self._runners += 1
+            threading.Thread(target=self._run, args=(self._executor,), daemon=True).start()
+
+    def _create_executor(self):
+        if self.file_timeout:
+            return IsolatedPool(self.workers, self.file_timeout)
+        return ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+
+    def _next_job(self):
+        # 调用方持有锁；跳过与运行中任务输出冲突的任务
+        for job in self._pending:
+            if job.output_key not in self._running_keys:
+                self._pending.remove(job)
+                self._running_keys.add(job.output_key)
+                job.state = RUNNING
+                return job
+        return None
+
+    def _run(self, executor):
+        while True:
+            with self._lock:
+                job = self._next_job()
+                if job is None:
+                    self._runners -= 1
+                    last = self._runners == 0
+                    if last and self._executor is executor:
+                        self._executor = None
+                    self._idle.notify_all()
+                    break
+            try:
+                self._run_job(job, executor)
+            finally:
+                with self._lock:
+                    self._running_keys.discard(job.output_key)
+                    # 被输出冲突推迟的任务可由空闲的线程接手
+                    self._spawn_runners()
+            if self.on_job_finished:
+                self.on_job_finished(job)
+        if last:
+            if executor is not None:
+                executor.shutdown()
+            if self.on_all_finished:
+                self.on_all_finished()
+
+    def _run_job(self, job, executor):
+        start = time.time()
+        cache = None
+        try:
+            # 同时运行的任务共用缓存文件，每次写入后立即提交，不长时间占用写锁
+            cache = ExtractCache(self.cache_path, commit_every=1 if self.max_concurrent > 1 else 200) \
+                if self.cache_path else None
+            options = dict(job.options)
+            options.setdefault("file_timeout", self.file_timeout)
+            job.processor = ExcelProcessor(
+                job.src_dir, job.out_dir, job.config,
+                logger=lambda msg: self.logger(f"[{job.label}] {msg}"),
+                workers=self.workers, engine=self.engine, cache=cache, executor=executor, **options)
+            if job.cancel_requested:
+                job.state = CANCELLED
+                return
+            _, job.rows, job.metrics = job.processor.merge_excels(
+                progress_callback=lambda percent: self._progress(job, percent),
+                status_callback=lambda *args: self.on_status and self.on_status(job, *args),
+                throughput_callback=lambda snapshot: setattr(job, "throughput", snapshot))
+            job.out_paths = job.processor.out_paths
+            job.state = CANCELLED if job.processor.cancelled else DONE
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+            self.logger(f"[{job.label}] 合并出错: {e}")
+        finally:
+            job.elapsed = time.time() - start
+            if cache:
+                cache.close()
+
+    def _progress(self, job, percent):
+        job.percent = percent
+        if self.on_progress:
+            self.on_progress(job, percent)
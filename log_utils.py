@@ -0,0 +1,29 @@
+import logging
+from logging.handlers import MemoryHandler, RotatingFileHandler
+
+
+def create_file_logger(log_file, name="excel_merger", max_bytes=5 * 1024 * 1024, backup_count=5,
+                       buffer_capacity=200):
+    # 常驻的文件日志：按大小滚动，写入先在内存中缓冲，满 buffer_capacity 条或遇到 ERROR 时落盘
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not logger.handlers:
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                           encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(MemoryHandler(buffer_capacity, flushLevel=logging.ERROR, target=file_handler))
+    return logger
+
+
+def flush_logger(logger):
+    for handler in logger.handlers:
+        handler.flush()
+
+
+def close_logger(logger):
+    for handler in list(logger.handlers):
+        handler.close()
+        if isinstance(handler, MemoryHandler) and handler.target:
+            handler.target.close()
+        logger.removeHandler(handler)
@@ -2,14 +2,84 @@ import sys
 import os
 import time
 import shutil
+import multiprocessing
+from collections import deque
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QTableWidget,
-    QTableWidgetItem, QFileDialog, QMessageBox, QProgressBar, QPlainTextEdit, QComboBox, QInputDialog
+    QTableWidgetItem, QFileDialog, QMessageBox, QProgressBar, QPlainTextEdit, QComboBox, QInputDialog,
+    QCheckBox, QHeaderView
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal
 from PyQt5.QtGui import QFont, QCursor, QColor, QIcon
 from config_manager import ConfigManager
 from excel_processor import ExcelProcessor
+from extract_cache import ExtractCache
+from output_sinks import OUTPUT_FORMATS
+from job_queue import JobQueue, MergeJob, QUEUED, RUNNING, DONE
+from template_fingerprint import learn_fingerprint
+from log_utils import create_file_logger, flush_logger, close_logger
+
+
+# 单个文件的最长提取时间（秒），超时的文件记为失败，不影响其他文件
+FILE_TIMEOUT = 300
+# 任务队列中同时运行的任务数，各任务共用一个提取进程池
+QUEUE_CONCURRENT_JOBS = 2
+# 每个合并任务的缓冲区内存预算（MB，不含程序本身的内存），超出部分暂存到输出目录下的临时文件
+MEMORY_BUDGET_MB = 2048
+
+
+class MergeWorker(QThread):
+    # 在后台线程执行合并，进度与日志通过信号（跨线程自动排队）回到界面线程
+    progress_changed = pyqtSignal(int)
+    status_changed = pyqtSignal(str, int, int, float)
+    throughput_changed = pyqtSignal(dict)
+    log_message = pyqtSignal(str)
+    merge_finished = pyqtSignal(str, int, bool)
+    merge_failed = pyqtSignal(str)
+
+    def __init__(self, src_dir, out_dir, config, cache_path, workers=1, recursive=False, output_formats=("xlsx",),
+                 upsert_key=None, file_timeout=None, dedup=False, dedup_key=None, templates=None,
+                 memory_mb=None):
+        super().__init__()
+        self.cache_path = cache_path
+        self.processor = ExcelProcessor(src_dir, out_dir, config, logger=self.log_message.emit,
+                                        workers=workers, recursive=recursive, output_formats=output_formats,
+                                        upsert_key=upsert_key, file_timeout=file_timeout, dedup=dedup,
+                                        dedup_key=dedup_key, templates=templates, memory_mb=memory_mb)
+
+    def run(self):
+        # sqlite 连接只能在创建它的线程中使用，因此缓存在工作线程内打开
+        cache = ExtractCache(self.cache_path)
+        self.processor.cache = cache
+        try:
+            _, total_rows, _ = self.processor.merge_excels(
+                progress_callback=self.progress_changed.emit,
+                status_callback=self.status_changed.emit,
+                throughput_callback=self.throughput_changed.emit
+            )
+            self.merge_finished.emit("\n".join(self.processor.out_paths), total_rows, self.processor.cancelled)
+        except Exception as e:
+            self.merge_failed.emit(str(e))
+        finally:
+            cache.close()
+
+    def cancel(self):
+        self.processor.cancel()
+
+    def toggle_pause(self):
+        if self.processor.is_paused():
+            self.processor.resume()
+        else:
+            self.processor.pause()
+        return self.processor.is_paused()
+
+
+class QueueBridge(QObject):
+    # 任务队列的回调在任务线程中调用，经信号转回界面线程
+    job_progress = pyqtSignal(int, int)
+    job_finished = pyqtSignal(int)
+    all_finished = pyqtSignal()
+    log_message = pyqtSignal(str)
 
 
 class ExcelMergerApp(QWidget):
@@ -30,8 +100,25 @@ class ExcelMergerApp(QWidget):
         self.logs_dir = os.path.join(os.getcwd(), "logs")
         os.makedirs(self.logs_dir, exist_ok=True)
         self.log_file = os.path.join(self.logs_dir, "debug.log")
-        self.log_buffer = []
+        self.file_logger = create_file_logger(self.log_file)
+        # 待显示的日志行，由定时器批量追加到界面，避免每条日志重绘整个文本框
+        self.log_buffer = deque(maxlen=1000)
+        self.pending_status = None
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(200)
+        self.log_timer.timeout.connect(self.flush_log_view)
+        self.log_timer.start()
         self.history_stack = []
+        self.merge_worker = None
+        # 任务队列：未开始时任务暂存在 queue_jobs 中，开始后交给 job_queue 调度
+        self.queue_jobs = []
+        self.queue_rows = {}
+        self.job_queue = None
+        self.queue_bridge = QueueBridge()
+        self.queue_bridge.job_progress.connect(self.on_job_progress, Qt.QueuedConnection)
+        self.queue_bridge.job_finished.connect(self.on_job_finished, Qt.QueuedConnection)
+        self.queue_bridge.all_finished.connect(self.on_queue_finished, Qt.QueuedConnection)
+        self.queue_bridge.log_message.connect(self.log, Qt.QueuedConnection)
 
         self.config_mgr = ConfigManager()
         self.config = self.config_mgr.config
@@ -61,20 +148,40 @@ class ExcelMergerApp(QWidget):
         config_buttons_layout.addWidget(self.create_button("导入", "LightSlateGray", self.import_config_action))
         config_buttons_layout.addWidget(self.create_button("导出", "LightSlateGray", self.export_config_action))
         config_buttons_layout.addWidget(self.create_button("配置目录", "DarkSlateBlue", self.open_config_dir))
+        config_buttons_layout.addWidget(self.create_button("生成指纹", "DarkCyan", self.learn_fingerprint_action))
         layout_left.addLayout(config_buttons_layout)
 
         # 源目录
         src_layout = QHBoxLayout()
         src_layout.addWidget(self.create_button("选择源目录", "orange", self.choose_src_dir))
         self.label_src_path = QLabel("未选择源目录")
-        src_layout.addWidget(self.label_src_path)
+        src_layout.addWidget(self.label_src_path, 1)
+        self.check_recursive = QCheckBox("包含子目录")
+        src_layout.addWidget(self.check_recursive)
+        self.check_upsert = QCheckBox("增量更新")
+        self.check_upsert.setToolTip("只提取新增或变化的文件，按标识列（配置中的 key_column，缺省为第一个逐条记录取值的列）更新上一次的输出")
+        src_layout.addWidget(self.check_upsert)
+        self.check_dedup = QCheckBox("跳过重复")
+        self.check_dedup.setToolTip("跳过内容相同的重复文件；配置了 key_column 时同时报告标识相同但内容不同的记录")
+        src_layout.addWidget(self.check_dedup)
+        self.check_auto_config = QCheckBox("按指纹选配置")
+        self.check_auto_config.setToolTip("按模板指纹为每个文件自动选用表头相同的配置（如同一表单的不同模板版本），"
+                                          "与所有带指纹的配置都不相符的文件报告为失败")
+        src_layout.addWidget(self.check_auto_config)
         layout_left.addLayout(src_layout)
 
         # 输出目录
         out_layout = QHBoxLayout()
         out_layout.addWidget(self.create_button("选择输出目录", "orange", self.choose_out_dir))
         self.label_out_path = QLabel(f"默认输出: {self.out_dir}")
-        out_layout.addWidget(self.label_out_path)
+        out_layout.addWidget(self.label_out_path, 1)
+        # 输出格式，可同时勾选多种，一次提取全部写出
+        self.format_checks = {}
+        for fmt in OUTPUT_FORMATS:
+            check = QCheckBox(fmt)
+            check.setChecked(fmt == "xlsx")
+            self.format_checks[fmt] = check
+            out_layout.addWidget(check)
         layout_left.addLayout(out_layout)
 
         # 表格 headers
@@ -92,7 +199,16 @@ class ExcelMergerApp(QWidget):
         layout_left.addLayout(table_ops)
 
         # 合并按钮
-        layout_left.addWidget(self.create_button("开始合并", "green", self.run_merge))
+        merge_layout = QHBoxLayout()
+        self.btn_merge = self.create_button("开始合并", "green", self.run_merge)
+        self.btn_pause = self.create_button("暂停", "DarkOrange", self.toggle_pause_merge)
+        self.btn_cancel = self.create_button("取消", "lightcoral", self.cancel_merge)
+        merge_layout.addWidget(self.btn_merge, 2)
+        merge_layout.addWidget(self.btn_pause, 1)
+        merge_layout.addWidget(self.btn_cancel, 1)
+        self.btn_pause.setEnabled(False)
+        self.btn_cancel.setEnabled(False)
+        layout_left.addLayout(merge_layout)
         layout_main.addLayout(layout_left, 2)
 
         # 右栏布局
@@ -108,8 +224,29 @@ class ExcelMergerApp(QWidget):
         self.label_status.setWordWrap(True)
         layout_right.addWidget(self.label_status)
 
+        # 任务队列：多个源目录各用自己的配置，共用一个提取进程池，每个任务完成即写出结果
+        self.queue_table = QTableWidget()
+        self.queue_table.setColumnCount(4)
+        self.queue_table.setHorizontalHeaderLabels(["源目录", "配置", "状态", "进度"])
+        self.queue_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.queue_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.queue_table.setMaximumHeight(220)
+        layout_right.addWidget(self.queue_table)
+        queue_ops = QHBoxLayout()
+        self.btn_queue_add = self.create_button("加入队列", "DodgerBlue", self.add_current_job)
+        self.btn_queue_batch = self.create_button("批量添加子目录", "Teal", self.add_subfolder_jobs)
+        self.btn_queue_start = self.create_button("开始队列", "green", self.start_queue)
+        self.btn_queue_cancel = self.create_button("取消队列", "lightcoral", self.cancel_queue)
+        self.btn_queue_clear = self.create_button("清空队列", "gray", self.clear_queue)
+        for btn in (self.btn_queue_add, self.btn_queue_batch, self.btn_queue_start,
+                    self.btn_queue_cancel, self.btn_queue_clear):
+            queue_ops.addWidget(btn)
+        self.btn_queue_cancel.setEnabled(False)
+        layout_right.addLayout(queue_ops)
+
         self.debug_output = QPlainTextEdit()
         self.debug_output.setReadOnly(True)
+        self.debug_output.setMaximumBlockCount(1000)
         layout_right.addWidget(self.debug_output, stretch=1)
 
         layout_main.addLayout(layout_right, 4)
@@ -226,20 +363,32 @@ class ExcelMergerApp(QWidget):
     def log(self, msg):
         ts_msg = f"{time.strftime('%Y-%m-%d %H:%M:%S')} - {msg}"
         self.log_buffer.append(ts_msg)
-        if len(self.log_buffer) > 1000:
-            self.log_buffer.pop(0)
-        self.debug_output.setPlainText("\n".join(self.log_buffer))
+        self.file_logger.info(ts_msg)
+
+    def flush_log_view(self):
+        if self.pending_status is not None:
+            self.label_status.setText(self.pending_status)
+            self.pending_status = None
+        if not self.log_buffer:
+            return
+        lines = "\n".join(self.log_buffer)
+        self.log_buffer.clear()
+        self.debug_output.appendPlainText(lines)
         self.debug_output.verticalScrollBar().setValue(self.debug_output.verticalScrollBar().maximum())
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(ts_msg + "\n")
+
+    def update_throughput(self, throughput):
+        self.throughput = throughput
 
     def update_status_log(self, file_name, processed_files, total_files, remaining_seconds):
         remaining_time = time.strftime('%H:%M:%S', time.gmtime(remaining_seconds))
-        info = (f"文件: {file_name}\n"
-                f"已统计文件数量: {processed_files}/{total_files}\n"
-                f"预计剩余时间: {remaining_time}")
-        self.label_status.setText(info)
-        self.log(info)
+        throughput = self.throughput or {"files_per_sec": 0.0, "mb_per_sec": 0.0}
+        speed = f"{throughput['files_per_sec']:.1f} 个/秒，{throughput['mb_per_sec']:.1f} MB/秒"
+        # 状态标签只保留最新一条，随日志定时刷新；日志中每个文件只记一行
+        self.pending_status = (f"文件: {file_name}\n"
+                               f"已统计文件数量: {processed_files}/{total_files}\n"
+                               f"处理速度: {speed}\n"
+                               f"预计剩余时间: {remaining_time}")
+        self.log(f"文件: {file_name} ({processed_files}/{total_files})，速度 {speed}，预计剩余时间: {remaining_time}")
 
     def load_table_from_config(self):
         self.table.setRowCount(0)
@@ -312,19 +461,48 @@ class ExcelMergerApp(QWidget):
             self.log(f"新增配置文件: {new_name}")
 
     def save_config(self):
+        # 表格只编辑表头名与单元格，配置中的其他项（工作表、标识列等）及表头的附加项原样保留
+        old_headers = {h.get("name"): h for h in self.config.get("headers", []) if isinstance(h, dict)}
         headers = []
         for row in range(self.table.rowCount()):
             name_item = self.table.item(row, 0)
             cell_item = self.table.item(row, 1)
             if name_item and cell_item:
-                headers.append({"name": name_item.text(), "cell": cell_item.text()})
+                header = dict(old_headers.get(name_item.text(), {}))
+                header.update({"name": name_item.text(), "cell": cell_item.text()})
+                headers.append(header)
         filename = self.config_selector.currentText()
         path = os.path.join(self.config_mgr.configs_dir, filename)
-        self.config_mgr.save_config({"headers": headers}, path)
+        config = dict(self.config)
+        config["headers"] = headers
+        self.config_mgr.save_config(config, path)
+        error = ConfigManager.validate(config)
+        if error:
+            self.log(f"配置 {filename} 有误: {error}")
         # 保存后刷新配置列表
         self.refresh_config_list(filename)
         self.log(f"配置已保存到: {filename}")
 
+    def learn_fingerprint_action(self):
+        # 从样本工作簿生成当前配置的模板指纹（工作表名、尺寸、数据单元格旁的标签），合并时据此检查文件
+        sample, _ = QFileDialog.getOpenFileName(self, "选择样本工作簿", "", "Excel Files (*.xlsx *.xlsm *.xls)")
+        if not sample:
+            return
+        self.save_config()
+        filename = self.config_selector.currentText()
+        path = os.path.join(self.config_mgr.configs_dir, filename)
+        try:
+            fingerprint = learn_fingerprint(sample, self.config_mgr.compile_config(path))
+        except (ValueError, OSError) as e:
+            QMessageBox.warning(self, "生成指纹失败", str(e))
+            return
+        config = self.config_mgr.load_config(path)
+        config["fingerprint"] = fingerprint
+        self.config_mgr.save_config(config, path)
+        self.config = config
+        self.log(f"配置 {filename} 的模板指纹已更新：锚点 {len(fingerprint['anchors'])} 个，"
+                 f"尺寸 {fingerprint.get('dimension', '未知')}")
+
     def choose_src_dir(self):
         d = QFileDialog.getExistingDirectory(self, "选择源目录")
         if d:
@@ -339,28 +517,247 @@ class ExcelMergerApp(QWidget):
         else:
             self.label_out_path.setText(f"默认输出: {self.out_dir}")
 
-    def run_merge(self):
+    def current_merge_options(self):
+        # 保存并编译当前配置，收集界面上的合并选项；有误时提示并返回 None
         self.save_config()
+        output_formats = [fmt for fmt, check in self.format_checks.items() if check.isChecked()]
+        if not output_formats:
+            QMessageBox.warning(self, "提示", "请至少选择一种输出格式")
+            return None
+        # 合并前校验并编译配置，单元格地址等错误在处理文件前一次性报告
+        try:
+            plan = self.config_mgr.compile_config(
+                os.path.join(self.config_mgr.configs_dir, self.config_selector.currentText()))
+        except ValueError as e:
+            QMessageBox.warning(self, "配置有误", str(e))
+            return None
+        upsert_key = None
+        if self.check_upsert.isChecked():
+            upsert_key = plan.default_key_column
+            try:
+                plan.check_key_column(upsert_key)
+            except ValueError as e:
+                QMessageBox.warning(self, "配置有误", str(e))
+                return None
+        dedup = self.check_dedup.isChecked()
+        templates = None
+        if self.check_auto_config.isChecked():
+            templates, errors = self.config_mgr.compile_templates()
+            for error in errors:
+                self.log(f"配置有误，不参与模板匹配: {error}")
+        return plan, {"recursive": self.check_recursive.isChecked(), "output_formats": output_formats,
+                      "upsert_key": upsert_key, "dedup": dedup,
+                      "dedup_key": self.config.get("key_column") if dedup else None, "templates": templates,
+                      "memory_mb": MEMORY_BUDGET_MB}
+
+    def run_merge(self):
+        if self.merge_worker is not None or self.job_queue is not None:
+            return
         if not self.src_dir:
             QMessageBox.warning(self, "提示", "请选择源目录")
             return
+        options = self.current_merge_options()
+        if options is None:
+            return
+        plan, options = options
+        if options["upsert_key"]:
+            self.log(f"增量更新，标识列: {options['upsert_key']}")
         self.progress.setValue(0)
         self.label_percent.setText("0%")
-        processor = ExcelProcessor(self.src_dir, self.out_dir, self.config, logger=self.log)
-        try:
-            out_path, total_rows = processor.merge_excels(
-                progress_callback=lambda v: (self.progress.setValue(v),
-                                             self.label_percent.setText(f"{v}%")),
-                status_callback=lambda f, pf, tf, r: self.update_status_log(f, pf, tf, r)
-            )
-            QMessageBox.information(self, "合并完成", f"文件：{out_path}\n记录数：{total_rows}")
-            os.startfile(self.out_dir)
-        except Exception as e:
-            QMessageBox.critical(self, "错误", str(e))
-            self.log(f"合并出错: {str(e)}")
+        self.merge_worker = MergeWorker(self.src_dir, self.out_dir, plan,
+                                        os.path.join(self.logs_dir, "extract_cache.sqlite"),
+                                        workers=os.cpu_count() or 1, file_timeout=FILE_TIMEOUT, **options)
+        self.merge_worker.progress_changed.connect(self.update_progress, Qt.QueuedConnection)
+        self.throughput = None
+        self.merge_worker.throughput_changed.connect(self.update_throughput, Qt.QueuedConnection)
+        self.merge_worker.status_changed.connect(self.update_status_log, Qt.QueuedConnection)
+        self.merge_worker.log_message.connect(self.log, Qt.QueuedConnection)
+        self.merge_worker.merge_finished.connect(self.on_merge_finished, Qt.QueuedConnection)
+        self.merge_worker.merge_failed.connect(self.on_merge_failed, Qt.QueuedConnection)
+        self.merge_worker.finished.connect(self.on_worker_stopped)
+        self.set_merge_running(True)
+        self.merge_worker.start()
+
+    def set_merge_running(self, running):
+        self.btn_merge.setEnabled(not running)
+        self.btn_queue_start.setEnabled(not running)
+        self.btn_pause.setEnabled(running)
+        self.btn_cancel.setEnabled(running)
+        self.btn_pause.setText("暂停")
+
+    def update_progress(self, value):
+        self.progress.setValue(value)
+        self.label_percent.setText(f"{value}%")
+
+    def toggle_pause_merge(self):
+        if self.merge_worker is None:
+            return
+        paused = self.merge_worker.toggle_pause()
+        self.btn_pause.setText("继续" if paused else "暂停")
+        self.log("合并已暂停" if paused else "合并已继续")
+
+    def cancel_merge(self):
+        if self.merge_worker is None:
+            return
+        self.btn_cancel.setEnabled(False)
+        self.btn_pause.setEnabled(False)
+        self.merge_worker.cancel()
+        self.log("正在取消合并，将写出已提取的部分结果...")
+
+    def on_merge_finished(self, out_path, total_rows, cancelled):
+        self.flush_log_view()
+        flush_logger(self.file_logger)
+        title = "合并已取消" if cancelled else "合并完成"
+        note = "（部分结果）" if cancelled else ""
+        QMessageBox.information(self, title, f"文件：{out_path}{note}\n记录数：{total_rows}")
+        os.startfile(self.out_dir)
+
+    def on_merge_failed(self, message):
+        QMessageBox.critical(self, "错误", message)
+        self.log(f"合并出错: {message}")
+        flush_logger(self.file_logger)
+
+    def on_worker_stopped(self):
+        self.merge_worker.deleteLater()
+        self.merge_worker = None
+        self.set_merge_running(False)
+
+    def add_queue_job(self, src_dir, plan, options):
+        job = MergeJob(src_dir, plan, self.out_dir, config_name=self.config_selector.currentText(), **options)
+        row = self.queue_table.rowCount()
+        self.queue_table.insertRow(row)
+        for col, text in enumerate((src_dir, job.config_name, QUEUED, "0%")):
+            self.queue_table.setItem(row, col, QTableWidgetItem(text))
+        self.queue_rows[job.id] = (row, job)
+        if self.job_queue is not None:
+            # 队列运行中加入的任务直接参与调度
+            self.job_queue.add(job)
+        else:
+            self.queue_jobs.append(job)
+
+    def add_current_job(self):
+        if not self.src_dir:
+            QMessageBox.warning(self, "提示", "请选择源目录")
+            return
+        options = self.current_merge_options()
+        if options is None:
+            return
+        self.add_queue_job(self.src_dir, *options)
+        self.log(f"已加入队列: {self.src_dir}（{self.config_selector.currentText()}）")
 
+    def add_subfolder_jobs(self):
+        # 所选目录下的每个子目录各作为一个任务，使用当前配置与选项
+        parent = QFileDialog.getExistingDirectory(self, "选择包含多个源目录的上级目录")
+        if not parent:
+            return
+        subdirs = sorted(e.path for e in os.scandir(parent) if e.is_dir() and not e.name.startswith("."))
+        if not subdirs:
+            QMessageBox.warning(self, "提示", "所选目录下没有子目录")
+            return
+        options = self.current_merge_options()
+        if options is None:
+            return
+        for d in subdirs:
+            self.add_queue_job(d, *options)
+        self.log(f"已加入队列 {len(subdirs)} 个子目录（{self.config_selector.currentText()}）")
+
+    def start_queue(self):
+        if self.job_queue is not None or self.merge_worker is not None:
+            return
+        if not self.queue_jobs:
+            QMessageBox.warning(self, "提示", "队列中没有等待的任务")
+            return
+        bridge = self.queue_bridge
+        self.job_queue = JobQueue(workers=os.cpu_count() or 1, max_concurrent=QUEUE_CONCURRENT_JOBS,
+                                  cache_path=os.path.join(self.logs_dir, "extract_cache.sqlite"),
+                                  file_timeout=FILE_TIMEOUT, logger=bridge.log_message.emit,
+                                  on_progress=lambda job, percent: bridge.job_progress.emit(job.id, percent),
+                                  on_job_finished=lambda job: bridge.job_finished.emit(job.id),
+                                  on_all_finished=bridge.all_finished.emit)
+        for job in self.queue_jobs:
+            self.job_queue.add(job)
+        self.queue_jobs = []
+        self.progress.setValue(0)
+        self.label_percent.setText("0%")
+        self.btn_merge.setEnabled(False)
+        self.btn_queue_start.setEnabled(False)
+        self.btn_queue_cancel.setEnabled(True)
+        self.btn_queue_clear.setEnabled(False)
+        self.job_queue.start()
+        self.log("任务队列已开始")
+
+    def set_queue_cell(self, job_id, col, text):
+        row, _ = self.queue_rows[job_id]
+        self.queue_table.item(row, col).setText(text)
+
+    def on_job_progress(self, job_id, percent):
+        self.set_queue_cell(job_id, 2, RUNNING)
+        self.set_queue_cell(job_id, 3, f"{percent}%")
+        if self.job_queue is None:
+            return
+        # 总进度为本次队列中各任务进度的平均值，已结束的任务按 100% 计
+        jobs = self.job_queue.jobs
+        overall = sum(j.percent if j.state in (QUEUED, RUNNING) else 100 for j in jobs) // len(jobs)
+        self.update_progress(overall)
+
+    def on_job_finished(self, job_id):
+        row, job = self.queue_rows[job_id]
+        self.set_queue_cell(job_id, 2, job.state)
+        if job.state == DONE:
+            self.set_queue_cell(job_id, 3, f"{job.rows}条")
+            self.log(f"[{job.label}] 合并完成: {', '.join(job.out_paths)}，记录数 {job.rows}")
+        elif job.error:
+            self.queue_table.item(row, 2).setToolTip(job.error)
+
+    def on_queue_finished(self):
+        # 运行中又加入任务时队列会重新启动，此时不算结束
+        if self.job_queue is None or self.job_queue.running:
+            return
+        jobs = self.job_queue.jobs
+        self.job_queue = None
+        for job in jobs:
+            # 开始前就被取消的任务不经过 on_job_finished
+            self.set_queue_cell(job.id, 2, job.state)
+        self.btn_merge.setEnabled(True)
+        self.btn_queue_start.setEnabled(True)
+        self.btn_queue_cancel.setEnabled(False)
+        self.btn_queue_clear.setEnabled(True)
+        self.update_progress(100)
+        self.flush_log_view()
+        flush_logger(self.file_logger)
+        done = sum(1 for job in jobs if job.state == DONE)
+        QMessageBox.information(self, "任务队列结束",
+                                f"完成 {done} 个任务，未完成 {len(jobs) - done} 个\n输出目录：{self.out_dir}")
+
+    def cancel_queue(self):
+        if self.job_queue is None:
+            return
+        self.btn_queue_cancel.setEnabled(False)
+        self.job_queue.cancel()
+        self.log("正在取消任务队列，运行中的任务将写出已提取的部分结果...")
+
+    def clear_queue(self):
+        if self.job_queue is not None:
+            return
+        self.queue_jobs = []
+        self.queue_rows = {}
+        self.queue_table.setRowCount(0)
+
+    def closeEvent(self, event):
+        # 关闭窗口时先取消合并并等待部分结果写出
+        if self.merge_worker is not None:
+            self.merge_worker.cancel()
+            self.merge_worker.wait()
+        if self.job_queue is not None:
+            self.job_queue.cancel()
+            self.job_queue.wait()
+        self.log_timer.stop()
+        close_logger(self.file_logger)
+        super().closeEvent(event)
 
 if __name__ == "__main__":
+    # 打包为 exe 后多进程提取需要
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     app.setFont(QFont("Microsoft YaHei", 10))
     
@@ -0,0 +1,219 @@
+import os
+import sys
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import threading
+from collections import deque
+
+# 合并的内存预算（主进程）：合并本身逐行写出，不累积全部记录；随文件数或记录数增长的缓冲区
+# （待处理文件队列、预读缓冲、去重标识与文件大小分组、检查点索引、输出批次）按预算分配上限，
+# 超出部分写入临时目录的数据块或临时 SQLite，需要时再读回。
+# 预算只约束这些缓冲区，不含解释器、已加载的库（pyarrow 等）与工作进程本身的内存（通常 50-150 MB），
+# 进程的实际内存峰值为两者之和。
+
+# 预算的最小值，以及各部分的估算单条大小（字节）
+MIN_BUDGET_MB = 128
+_SOURCE_ITEM_BYTES = 1024
+_DEDUP_KEY_BYTES = 256
+_FILE_ITEM_BYTES = 512
+_CELL_BYTES = 64
+
+
+class MemoryBudget:
+    def __init__(self, total_mb):
+        if not total_mb or total_mb < MIN_BUDGET_MB:
+            raise ValueError(f"内存预算至少为 {MIN_BUDGET_MB} MB")
+        self.total_mb = total_mb
+
+    def _share(self, fraction):
+        return int(self.total_mb * fraction * 1048576)
+
+    @property
+    def prefetch_mb(self):
+        # 预读缓冲占四分之一（含已提交给工作进程、尚未完成的数据）
+        return max(8, self.total_mb // 4)
+
+    @property
+    def queued_sources(self):
+        # 已发现、尚未提取的文件在内存中最多保留的数量
+        return max(1000, self._share(0.05) // _SOURCE_ITEM_BYTES)
+
+    @property
+    def dedup_keys(self):
+        # 去重标识在内存中最多保留的数量，超出后转存到临时 SQLite
+        return max(10000, self._share(0.2) // _DEDUP_KEY_BYTES)
+
+    @property
+    def tracked_files(self):
+        # 每个文件一项的索引（检查点日志中的文件、去重的文件大小分组）在内存中最多保留的数量，各占 5%
+        return max(1000, self._share(0.05) // _FILE_ITEM_BYTES)
+
+    def batch_rows(self, column_count):
+        # 输出批次的行数（Parquet/SQLite），每种格式占 5%
+        return max(100, min(10000, self._share(0.05) // ((column_count + 1) * _CELL_BYTES)))
+
+
+def peak_memory_mb():
+    # 当前进程的内存峰值（MB），无法获取时返回 None
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+            counters = PROCESS_MEMORY_COUNTERS()
+            counters.cb = ctypes.sizeof(counters)
+            handle = ctypes.windll.kernel32.GetCurrentProcess()
+            if not ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                return None
+            return counters.PeakWorkingSetSize / 1048576
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为 KB，macOS 为字节
+        return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+    except Exception:
+        return None
+
+
+class SpillQueue:
+    # 线程安全的先进先出队列：内存中最多保留 max_items 项，超出后按块（chunk_items 项）写入临时目录，
+    # 取出时按原顺序读回。接口与 queue.Queue 的 put/get 相同
+    def __init__(self, max_items, chunk_items=None, spill_dir=None):
+        self.max_items = max_items
+        self.chunk_items = chunk_items or max(1, max_items // 4)
+        self.spill_dir = spill_dir
+        self.spilled_items = 0
+        # 每段为 deque（内存中）或 str（磁盘上的数据块路径），按顺序排列
+        self._segments = deque()
+        self._in_memory = 0
+        # 正在攒满、尚未写盘的数据块；开始写盘后新项目都先放这里，保证顺序
+        self._pending = []
+        self._temp_dir = None
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if self._closed:
+                return
+            spilling = self._pending or any(isinstance(s, str) for s in self._segments)
+            if not spilling and self._in_memory < self.max_items:
+                if not self._segments:
+                    self._segments.append(deque())
+                self._segments[-1].append(item)
+                self._in_memory += 1
+            else:
+                self._pending.append(item)
+                if len(self._pending) >= self.chunk_items:
+                    self._write_chunk()
+            self._cond.notify()
+
+    def _write_chunk(self):
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix=".spill_", dir=self.spill_dir)
+        fd, path = tempfile.mkstemp(suffix=".chunk", dir=self._temp_dir)
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self._pending, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.spilled_items += len(self._pending)
+        self._segments.append(path)
+        self._pending = []
+
+    def get(self):
+        with self._cond:
+            while True:
+                while self._segments:
+                    head = self._segments[0]
+                    if isinstance(head, str):
+                        # 读回磁盘上的数据块
+                        with open(head, "rb") as f:
+                            chunk = deque(pickle.load(f))
+                        os.remove(head)
+                        self._segments[0] = chunk
+                        self._in_memory += len(chunk)
+                        continue
+                    if head:
+                        self._in_memory -= 1
+                        return head.popleft()
+                    self._segments.popleft()
+                if self._pending:
+                    # 未写盘的数据块直接转为内存段
+                    self._segments.append(deque(self._pending))
+                    self._in_memory += len(self._pending)
+                    self._pending = []
+                    continue
+                self._cond.wait()
+
+    def close(self):
+        # 丢弃剩余项目并删除临时目录
+        with self._cond:
+            self._closed = True
+            self._segments.clear()
+            self._pending = []
+            self._in_memory = 0
+            if self._temp_dir is not None:
+                shutil.rmtree(self._temp_dir, ignore_errors=True)
+                self._temp_dir = None
+
+
+class SpillMap:
+    # 键 -> 取值的映射：内存中最多保留 max_items 项，超出后整批转存到 spill_dir 下的临时 SQLite
+    # （取值按 pickle 保存），之后先查内存再查临时库。max_items 为 None 时不转存。键为文本或整数
+    def __init__(self, max_items=None, spill_dir=None):
+        self.max_items = max_items
+        self.spill_dir = spill_dir
+        self.spilled = 0
+        self._items = {}
+        self._db = None
+        self._db_path = None
+        self._db_count = 0
+
+    def __len__(self):
+        return len(self._items) + self._db_count
+
+    def get(self, key, default=None):
+        if key in self._items:
+            return self._items[key]
+        if self._db is not None:
+            found = self._db.execute("SELECT value FROM items WHERE key = ?", (key,)).fetchone()
+            if found is not None:
+                return pickle.loads(found[0])
+        return default
+
+    def put(self, key, value):
+        if self._db is not None and key not in self._items:
+            # 内存与临时库中的键互不重复
+            self._db_count -= self._db.execute("DELETE FROM items WHERE key = ?", (key,)).rowcount
+        self._items[key] = value
+        if self.max_items and len(self._items) >= self.max_items:
+            self._spill()
+
+    def _spill(self):
+        if self._db is None:
+            fd, self._db_path = tempfile.mkstemp(prefix=".spill_", suffix=".sqlite", dir=self.spill_dir)
+            os.close(fd)
+            self._db = sqlite3.connect(self._db_path)
+            self._db.execute("PRAGMA journal_mode=OFF")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute("CREATE TABLE items (key PRIMARY KEY, value BLOB)")
+        self._db.executemany("INSERT INTO items VALUES (?, ?)",
+                             ((k, pickle.dumps(v, protocol=pickle.HIGHEST_PROTOCOL)) for k, v in self._items.items()))
+        self._db_count += len(self._items)
+        self.spilled += len(self._items)
+        self._items = {}
+
+    def close(self):
+        # 删除临时库
+        self._items = {}
+        self._db_count = 0
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            os.remove(self._db_path)
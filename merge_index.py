@@ -0,0 +1,128 @@
+import os
+import json
+import pickle
+import sqlite3
+
+# 增量合并（追加/更新）使用的旁路索引：保存每个源文件的大小、修改时间及其产出的记录，
+# 记录以标识列（如 省级编号）为键。再次合并时只重新提取新增或变化的文件，替换这些文件的旧记录，
+# 标识相同的记录以最新文件为准；输出文件由索引直接导出，不再解析未变化的源文件。
+# 源目录中已删除的文件，其记录仍保留在索引中。
+
+INDEX_VERSION = 1
+
+
+def order_key(rel_path):
+    # 与 iter_source_files 的遍历顺序一致：目录内按名称排序，本目录文件排在子目录之前
+    parts = rel_path.split("/")
+    return "/".join(["1" + d for d in parts[:-1]] + ["0" + parts[-1]])
+
+
+class MergeIndex:
+    def __init__(self, db_path, src_dir, config_hash, key_column):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != INDEX_VERSION:
+            for table in ("meta", "sources", "records"):
+                self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self.conn.execute(f"PRAGMA user_version={INDEX_VERSION}")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " rel_path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            " key TEXT PRIMARY KEY,"
+            " rel_path TEXT NOT NULL,"
+            " order_key TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " row BLOB NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS records_source ON records (rel_path)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS records_order ON records (order_key, seq)")
+
+        src_dir = os.path.abspath(src_dir)
+        stored_src = self._get_meta("src_dir")
+        if stored_src is not None and os.path.normcase(stored_src) != os.path.normcase(src_dir):
+            self.conn.close()
+            raise ValueError(f"增量索引属于另一个源目录: {stored_src}")
+        # 配置或标识列变化后旧记录不再可用，清空后全部重新提取
+        self.rebuilt = stored_src is not None and (self._get_meta("config_hash") != config_hash
+                                                   or self._get_meta("key_column") != key_column)
+        if self.rebuilt:
+            self.conn.execute("DELETE FROM sources")
+            self.conn.execute("DELETE FROM records")
+        self._set_meta("src_dir", src_dir)
+        self._set_meta("config_hash", config_hash)
+        self._set_meta("key_column", key_column)
+        self.conn.commit()
+        self._sources = dict((r[0], (r[1], r[2])) for r in self.conn.execute(
+            "SELECT rel_path, size, mtime_ns FROM sources"))
+
+    def _get_meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name=?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, name, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+    @property
+    def source_count(self):
+        return len(self._sources)
+
+    def is_current(self, source):
+        # 源文件大小与修改时间均未变化时沿用索引中的记录
+        return self._sources.get(source.rel_path) == (source.size, source.mtime_ns)
+
+    def replace_source(self, source, rows, key_index):
+        # 删除该文件原有的记录后写入新记录；标识为空的记录以 "文件路径#序号" 为键，不与其他记录合并
+        self.conn.execute("DELETE FROM records WHERE rel_path=?", (source.rel_path,))
+        ok = order_key(source.rel_path)
+        replaced = 0
+        for seq, row in enumerate(rows):
+            key = row[key_index]
+            key = f"{source.rel_path}#{seq}" if key is None or key == "" else str(key)
+            cur = self.conn.execute("DELETE FROM records WHERE key=?", (key,))
+            replaced += cur.rowcount
+            self.conn.execute(
+                "INSERT INTO records (key, rel_path, order_key, seq, row) VALUES (?, ?, ?, ?, ?)",
+                (key, source.rel_path, ok, seq, pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL)))
+        self.conn.execute("INSERT OR REPLACE INTO sources (rel_path, size, mtime_ns) VALUES (?, ?, ?)",
+                          (source.rel_path, source.size, source.mtime_ns))
+        self._sources[source.rel_path] = (source.size, source.mtime_ns)
+        return replaced
+
+    def record(self, key, exclude=None):
+        # 返回标识为 key 的记录 (相对路径, 记录元组)；记录属于 exclude 文件（即将被替换）时视为不存在
+        found = self.conn.execute("SELECT rel_path, row FROM records WHERE key=?", (key,)).fetchone()
+        if found is None or found[0] == exclude:
+            return None
+        return found[0], tuple(pickle.loads(found[1]))
+
+    @property
+    def row_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def iter_rows(self):
+        for (row,) in self.conn.execute("SELECT row FROM records ORDER BY order_key, seq"):
+            yield pickle.loads(row)
+
+    @property
+    def out_paths(self):
+        value = self._get_meta("out_paths")
+        return json.loads(value) if value else []
+
+    def set_out_paths(self, out_paths):
+        self._set_meta("out_paths", json.dumps(out_paths, ensure_ascii=False))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
@@ -0,0 +1,94 @@
+import os
+import time
+import pickle
+from memory_budget import SpillMap
+
+# 合并检查点日志：每个成功提取的文件追加一条 (相对路径, 大小, 修改时间, 记录列表)，定期刷盘。
+# 合并中断（崩溃、断电、取消）后再次合并同一目录时，未变化的文件直接使用日志中的结果，
+# 从中断处继续提取；合并正常完成后删除日志。首条记录保存源目录与配置哈希，不一致时日志作废。
+# 加载时只记录每条记录在日志中的位置，重放时再按位置读取记录列表，内存占用与文件数成正比而非记录数；
+# 设置 max_entries 时超出的位置索引转存到 spill_dir 下的临时 SQLite。
+
+JOURNAL_VERSION = 1
+
+
+class MergeJournal:
+    def __init__(self, path, src_dir, config_hash, checkpoint_every=50, checkpoint_secs=5.0, max_entries=None,
+                 spill_dir=None):
+        self.path = path
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_secs = checkpoint_secs
+        # 相对路径 -> (大小, 修改时间, 记录在日志中的位置)
+        self.entries = SpillMap(max_entries, spill_dir)
+        self._reader = None
+        header = {"version": JOURNAL_VERSION, "src_dir": os.path.abspath(src_dir), "config_hash": config_hash}
+        valid_end = self._load(header)
+        if valid_end:
+            # 截掉中断时写了一半的末尾记录，在其后继续追加
+            self.f = open(path, "r+b")
+            self.f.truncate(valid_end)
+            self.f.seek(valid_end)
+            if self.entries:
+                self._reader = open(path, "rb")
+        else:
+            self.entries.close()
+            self.f = open(path, "wb")
+            pickle.dump(header, self.f, protocol=pickle.HIGHEST_PROTOCOL)
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _load(self, header):
+        # 返回最后一条完整记录的结束位置；日志不存在或不属于本次合并时返回 0
+        if not os.path.exists(self.path):
+            return 0
+        valid_end = 0
+        with open(self.path, "rb") as f:
+            try:
+                if pickle.load(f) != header:
+                    return 0
+                valid_end = f.tell()
+                while True:
+                    offset = f.tell()
+                    rel_path, size, mtime_ns, _ = pickle.load(f)
+                    self.entries.put(rel_path, (size, mtime_ns, offset))
+                    valid_end = f.tell()
+            except EOFError:
+                pass
+            except Exception:
+                # 末尾记录不完整
+                pass
+        return valid_end
+
+    def lookup(self, source):
+        entry = self.entries.get(source.rel_path)
+        if entry is None or entry[:2] != (source.size, source.mtime_ns):
+            return None
+        self._reader.seek(entry[2])
+        return pickle.load(self._reader)[3]
+
+    def append(self, source, rows):
+        pickle.dump((source.rel_path, source.size, source.mtime_ns, rows), self.f,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+        self._unsynced += 1
+        if self._unsynced >= self.checkpoint_every or time.monotonic() - self._last_sync >= self.checkpoint_secs:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self, remove=False):
+        self.entries.close()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self.f.closed:
+            return
+        if remove:
+            self.f.close()
+            os.remove(self.path)
+        else:
+            self.checkpoint()
+            self.f.close()
@@ -0,0 +1,122 @@
+import time
+import heapq
+from contextlib import contextmanager
+from memory_budget import peak_memory_mb
+
+# 合并过程的分阶段计时与计数。工作进程内的单文件阶段耗时（解压、XML 解析、共享字符串、
+# 样式、取值转换）随结果返回，在主进程中汇总；主进程自身的阶段（发现、缓存、写出）直接计时。
+
+
+class MergeMetrics:
+    def __init__(self, slowest_n=10):
+        self.slowest_n = slowest_n
+        self.stages = {}
+        self.counters = {
+            "files_total": 0,
+            "files_ok": 0,
+            "files_failed": 0,
+            "cache_hits": 0,
+            "journal_replayed": 0,
+            "bytes_read": 0,
+            "cells_resolved": 0,
+            "rows_written": 0,
+        }
+        self.failures_by_type = {}
+        # 按模板指纹选用的配置 -> 文件数
+        self.templates = {}
+        self._slowest = []
+        self._seq = 0
+        self.started_at = time.time()
+        self.elapsed = 0.0
+        # 主进程的内存峰值（MB）与内存预算，无法获取或未设置时为 None
+        self.peak_memory_mb = None
+        self.memory_budget_mb = None
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - start)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_file(self, file_name, stats, error=None):
+        # stats 为工作进程返回的单文件统计；缓存命中时为 {"cached": True}，检查点重放时为 {"journaled": True}
+        self.count("files_total")
+        if stats.get("cached"):
+            self.count("cache_hits")
+        if stats.get("journaled"):
+            self.count("journal_replayed")
+        if stats.get("duplicate_of"):
+            self.count("duplicates_skipped")
+        if stats.get("prefetched"):
+            self.count("files_prefetched")
+        if stats.get("template"):
+            self.templates[stats["template"]] = self.templates.get(stats["template"], 0) + 1
+        if stats.get("attempts", 1) > 1:
+            self.count("retries", stats["attempts"] - 1)
+        if error is not None:
+            self.count("files_failed")
+            error_type = stats.get("error_type", "Exception")
+            self.failures_by_type[error_type] = self.failures_by_type.get(error_type, 0) + 1
+        else:
+            self.count("files_ok")
+        self.count("bytes_read", stats.get("bytes_read", 0))
+        self.count("cells_resolved", stats.get("cells", 0))
+        for stage, seconds in stats.get("stages", {}).items():
+            self.add_stage(stage, seconds)
+        seconds = stats.get("seconds")
+        if seconds is not None:
+            self.add_stage("extract", seconds)
+            # 小顶堆只保留最慢的 N 个文件
+            self._seq += 1
+            item = (seconds, self._seq, file_name)
+            if len(self._slowest) < self.slowest_n:
+                heapq.heappush(self._slowest, item)
+            elif item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+
+    @property
+    def slowest_files(self):
+        return [(name, round(seconds, 4)) for seconds, _, name in sorted(self._slowest, reverse=True)]
+
+    def finish(self):
+        self.elapsed = time.time() - self.started_at
+        self.peak_memory_mb = peak_memory_mb()
+
+    def to_dict(self):
+        return {
+            "elapsed": round(self.elapsed, 4),
+            "stages": {k: round(v, 4) for k, v in sorted(self.stages.items())},
+            "counters": dict(self.counters),
+            "failures_by_type": dict(self.failures_by_type),
+            "templates": dict(self.templates),
+            "slowest_files": self.slowest_files,
+            "peak_memory_mb": round(self.peak_memory_mb, 1) if self.peak_memory_mb is not None else None,
+            "memory_budget_mb": self.memory_budget_mb,
+        }
+
+    def summary(self):
+        c = self.counters
+        lines = [f"用时 {self.elapsed:.1f} 秒，文件 {c['files_total']} 个（成功 {c['files_ok']}，"
+                 f"失败 {c['files_failed']}，缓存命中 {c['cache_hits']}），"
+                 f"读取 {c['bytes_read'] / 1048576:.1f} MB，单元格 {c['cells_resolved']} 个"]
+        if self.stages:
+            lines.append("阶段耗时: " + "，".join(f"{k} {v:.2f}s" for k, v in sorted(self.stages.items())))
+        if self.failures_by_type:
+            lines.append("失败类型: " + "，".join(f"{k} {v}" for k, v in self.failures_by_type.items()))
+        if self.templates:
+            lines.append("模板匹配: " + "，".join(f"{k} {v}" for k, v in self.templates.items()))
+        if self.peak_memory_mb is not None:
+            # 峰值含解释器与已加载模块本身的内存，预算只约束合并中的各个缓冲区
+            budget = f"（缓冲区预算 {self.memory_budget_mb} MB，不含解释器与库本身）" if self.memory_budget_mb else ""
+            lines.append(f"内存峰值 {self.peak_memory_mb:.0f} MB{budget}")
+        if self._slowest:
+            lines.append("最慢文件: " + "，".join(f"{name} {s:.2f}s" for name, s in self.slowest_files[:5]))
+        return "\n".join(lines)
@@ -0,0 +1,360 @@
+import os
+import csv
+import pickle
+import sqlite3
+import tempfile
+from datetime import datetime, date, time
+
+# 进程的 umask（os.umask 只能设置后再还原，在导入时读取一次，避免多线程时临时改动）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def build_output_path(out_dir, folder_name, row_count, ext=".xlsx"):
+    # ===================== 文件命名规则 =====================
+    # 1. 源目录最后一级文件夹名 + 数据行数组合基础文件名
+    base_filename = f"{folder_name}_集合_{row_count}条{ext}"
+    out_path = os.path.join(out_dir, base_filename)
+    # 2. 检查是否冲突（已有同名文件），冲突则加时间后缀
+    if os.path.exists(out_path):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        base_filename = f"{folder_name}_集合_{row_count}条_{timestamp}{ext}"
+        out_path = os.path.join(out_dir, base_filename)
+    # =======================================================
+    return out_path
+
+
+class _FileSink:
+    # 流式输出的公共部分：行数在结束前未知，先写到输出目录下的临时文件，close 时按命名规则重命名
+    ext = ""
+
+    def __init__(self, out_dir, folder_name):
+        self.out_dir = out_dir
+        self.folder_name = folder_name
+        self.row_count = 0
+        self.temp_path = None
+
+    def _create_temp(self):
+        fd, self.temp_path = tempfile.mkstemp(prefix=".merging_", suffix=self.ext + ".tmp", dir=self.out_dir)
+        os.close(fd)
+
+    def _finish(self):
+        out_path = build_output_path(self.out_dir, self.folder_name, self.row_count, self.ext)
+        # mkstemp 创建的临时文件只有所有者可读写，重命名前恢复为按 umask 的普通权限
+        os.chmod(self.temp_path, 0o666 & ~_UMASK)
+        os.replace(self.temp_path, out_path)
+        return out_path
+
+    def _release(self):
+        # 关闭已打开的文件句柄或连接，子类按需实现
+        pass
+
+    def abort(self):
+        self._release()
+        if self.temp_path and os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+def _unique_names(header_names):
+    # 数据库表与 Parquet 的列名不能重复，重复的表头追加序号
+    seen = {}
+    names = []
+    for name in header_names:
+        name = str(name)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}_{seen[name]}"
+        else:
+            seen[name] = 1
+        names.append(name)
+    return names
+
+
+def _text(value):
+    # 日期时间统一写成 ISO 格式文本
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    return value
+
+
+class XlsxSink(_FileSink):
+    # 基于 openpyxl 只写模式的流式输出：每行追加后即写入临时文件，内存占用不随行数增长
+    ext = ".xlsx"
+
+    def __init__(self, out_dir, folder_name):
+        super().__init__(out_dir, folder_name)
+        self.wb = None
+        self.ws = None
+
+    def open(self, header_names):
+        self._create_temp()
+        import openpyxl
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Sheet1")
+        self.ws.append(header_names)
+
+    def write_row(self, row):
+        self.ws.append(row)
+        self.row_count += 1
+
+    def close(self):
+        self.wb.save(self.temp_path)
+        return self._finish()
+
+    def _release(self):
+        # 中途放弃时结束工作表的写入生成器，避免回收时向已关闭的文件写入
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+
+
+class CsvSink(_FileSink):
+    # UTF-8 带 BOM，Excel 直接打开中文不乱码
+    ext = ".csv"
+
+    def __init__(self, out_dir, folder_name):
+        super().__init__(out_dir, folder_name)
+        self.f = None
+        self.writer = None
+
+    def open(self, header_names):
+        self._create_temp()
+        self.f = open(self.temp_path, "w", encoding="utf-8-sig", newline="")
+        self.writer = csv.writer(self.f)
+        self.writer.writerow(header_names)
+
+    def write_row(self, row):
+        self.writer.writerow([_text(v) for v in row])
+        self.row_count += 1
+
+    def close(self):
+        self._release()
+        return self._finish()
+
+    def _release(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+
+class SqliteSink(_FileSink):
+    # 所有记录写入 records 表；列不声明类型，数值与文本按原类型保存
+    ext = ".sqlite"
+    table = "records"
+
+    def __init__(self, out_dir, folder_name, batch_size=1000):
+        super().__init__(out_dir, folder_name)
+        self.batch_size = batch_size
+        self.conn = None
+        self.insert_sql = None
+        self.batch = []
+
+    def open(self, header_names):
+        self._create_temp()
+        self.conn = sqlite3.connect(self.temp_path)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        columns = ", ".join('"{}"'.format(name.replace('"', '""')) for name in _unique_names(header_names))
+        self.conn.execute(f"CREATE TABLE {self.table} ({columns})")
+        self.insert_sql = f"INSERT INTO {self.table} VALUES ({', '.join('?' * len(header_names))})"
+
+    def write_row(self, row):
+        self.batch.append([_text(v) for v in row])
+        self.row_count += 1
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self.batch:
+            self.conn.executemany(self.insert_sql, self.batch)
+            self.batch = []
+
+    def close(self):
+        self._flush()
+        self.conn.commit()
+        self._release()
+        return self._finish()
+
+    def _release(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+# Parquet 列类型推断：每列取值的类别，合并后不一致的列保存为文本
+_INT64_RANGE = (-(1 << 63), (1 << 63) - 1)
+
+
+def _value_kind(value):
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int" if _INT64_RANGE[0] <= value <= _INT64_RANGE[1] else "string"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, datetime):
+        return "timestamp"
+    if isinstance(value, date):
+        return "date"
+    return "string"
+
+
+def _merge_kind(kind, value_kind):
+    if kind is None or kind == value_kind:
+        return value_kind
+    if {kind, value_kind} == {"int", "float"}:
+        return "float"
+    return "string"
+
+
+class ParquetSink(_FileSink):
+    # 需要 pyarrow。每列的类型按全部取值推断：整列为整数、数值、日期时间、日期或布尔时保存为对应类型，
+    # 类型混杂（如数值与文本）或全部为空的列保存为文本。写出时先按批暂存到临时文件并统计类型，
+    # close 时确定表结构后再逐批写入行组，内存占用仍为一批
+    ext = ".parquet"
+
+    def __init__(self, out_dir, folder_name, batch_size=10000):
+        super().__init__(out_dir, folder_name)
+        self.batch_size = batch_size
+        self.writer = None
+        self.pa = self.pq = None
+        self.names = None
+        self.kinds = None
+        self.batch = []
+        self.spool = None
+        self.spool_path = None
+
+    def open(self, header_names):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("输出 Parquet 文件需要安装 pyarrow（pip install pyarrow）")
+        self.pa, self.pq = pa, pq
+        self._create_temp()
+        self.names = _unique_names(header_names)
+        self.kinds = [None] * len(self.names)
+        fd, self.spool_path = tempfile.mkstemp(prefix=".merging_", suffix=".parquet.spool", dir=self.out_dir)
+        self.spool = os.fdopen(fd, "w+b")
+
+    def write_row(self, row):
+        self.batch.append(row)
+        self.row_count += 1
+        if len(self.batch) >= self.batch_size:
+            self._spool_batch()
+
+    def _spool_batch(self):
+        if not self.batch:
+            return
+        kinds = self.kinds
+        for row in self.batch:
+            for i, value in enumerate(row):
+                if value is not None and kinds[i] != "string":
+                    kinds[i] = _merge_kind(kinds[i], _value_kind(value))
+        pickle.dump(self.batch, self.spool, protocol=pickle.HIGHEST_PROTOCOL)
+        self.batch = []
+
+    def _column(self, values, kind):
+        pa = self.pa
+        if kind == "int":
+            return pa.array(values, pa.int64())
+        if kind == "float":
+            return pa.array([None if v is None else float(v) for v in values], pa.float64())
+        if kind == "bool":
+            return pa.array(values, pa.bool_())
+        if kind == "timestamp":
+            return pa.array(values, pa.timestamp("us"))
+        if kind == "date":
+            return pa.array(values, pa.date32())
+        return pa.array([None if v is None else str(_text(v)) for v in values], pa.string())
+
+    def close(self):
+        pa = self.pa
+        self._spool_batch()
+        kinds = [kind or "string" for kind in self.kinds]
+        schema = pa.schema([(name, self._column([], kind).type) for name, kind in zip(self.names, kinds)])
+        self.writer = self.pq.ParquetWriter(self.temp_path, schema)
+        self.spool.seek(0)
+        while True:
+            try:
+                batch = pickle.load(self.spool)
+            except EOFError:
+                break
+            columns = [self._column(list(col), kind) for col, kind in zip(zip(*batch), kinds)]
+            self.writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        self._release()
+        return self._finish()
+
+    def _release(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+            os.remove(self.spool_path)
+
+
+# 输出格式名 -> 输出类
+OUTPUT_FORMATS = {
+    "xlsx": XlsxSink,
+    "csv": CsvSink,
+    "parquet": ParquetSink,
+    "sqlite": SqliteSink,
+}
+
+
+def check_formats(formats):
+    # 校验并去重输出格式列表
+    if not formats:
+        raise ValueError("至少需要一种输出格式")
+    unknown = [f for f in formats if f not in OUTPUT_FORMATS]
+    if unknown:
+        raise ValueError(f"未知的输出格式: {', '.join(unknown)}（可选: {', '.join(OUTPUT_FORMATS)}）")
+    return tuple(dict.fromkeys(formats))
+
+
+class MultiSink:
+    # 一次提取同时写出多种格式；close 返回各格式的输出路径（顺序与 formats 一致）。
+    # batch_size 设置按批写出的格式（parquet/sqlite）每批的行数，None 时用各格式的默认值
+    def __init__(self, out_dir, folder_name, formats=("xlsx",), batch_size=None):
+        self.sinks = [OUTPUT_FORMATS[f](out_dir, folder_name) for f in check_formats(formats)]
+        if batch_size:
+            for sink in self.sinks:
+                if hasattr(sink, "batch_size"):
+                    sink.batch_size = batch_size
+
+    @property
+    def row_count(self):
+        return self.sinks[0].row_count
+
+    def open(self, header_names):
+        try:
+            for sink in self.sinks:
+                sink.open(header_names)
+        except BaseException:
+            self.abort()
+            raise
+
+    def write_row(self, row):
+        for sink in self.sinks:
+            sink.write_row(row)
+
+    def close(self):
+        out_paths = []
+        try:
+            for sink in self.sinks:
+                out_paths.append(sink.close())
+        except BaseException:
+            self.abort()
+            raise
+        return out_paths
+
+    def abort(self):
+        for sink in self.sinks:
+            sink.abort()
@@ -0,0 +1,120 @@
+import os
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# 源文件预读：后台线程提前读取后续文件的全部字节，解析时直接使用内存中的数据，
+# 网络共享（SMB 等）的读取延迟与解析重叠而不是相加。预读文件数与缓冲字节数都有上限，
+# 超过内存上限的大文件不预读，由解析进程自行读取。预读的字节从读取开始计入上限，
+# 直到调用方释放（交给工作进程的数据在任务完成后才释放），提交窗口中的数据同样受上限约束。
+
+DEFAULT_PREFETCH_WINDOW = 16
+DEFAULT_PREFETCH_MB = 256
+PREFETCH_THREADS = 4
+
+# Linux 下视为网络文件系统的挂载类型
+_NETWORK_FS_TYPES = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "afs", "9p", "fuse.sshfs", "fuse.rclone"}
+
+
+def is_network_path(path):
+    # 判断路径是否位于网络共享上，用于自动决定是否启用预读
+    path = os.path.abspath(path)
+    if sys.platform == "win32":
+        if path.startswith("\\\\"):
+            return True
+        try:
+            import ctypes
+            # DRIVE_REMOTE = 4
+            return ctypes.windll.kernel32.GetDriveTypeW(os.path.splitdrive(path)[0] + "\\") == 4
+        except Exception:
+            return False
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if line.strip()]
+    except OSError:
+        return False
+    best, fs_type = "", None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace("\\040", " ")
+        if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) > len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type in _NETWORK_FS_TYPES
+
+
+def _read_bytes(path):
+    # 读取失败时返回 None，由解析进程重新读取并按正常流程重试或报错
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class _Budget:
+    # 预读字节的占用，释放可在其他线程（如任务完成回调）中进行
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, size, block):
+        # 超出上限时 block 为 False 则立即返回 False，否则等待释放；没有占用时总能取得，保证至少预读一个
+        with self._cond:
+            while self.used and self.used + size > self.limit:
+                if not block:
+                    return False
+                self._cond.wait()
+            self.used += size
+            return True
+
+    def releaser(self, size):
+        # 返回只生效一次的释放函数
+        released = []
+
+        def release(*_):
+            if size and not released:
+                released.append(True)
+                with self._cond:
+                    self.used -= size
+                    self._cond.notify_all()
+        return release
+
+
+def prefetch(items, window=DEFAULT_PREFETCH_WINDOW, memory_mb=DEFAULT_PREFETCH_MB, threads=PREFETCH_THREADS):
+    # items 产出 (SourceFile, 附带信息, 是否需要读取)，按原顺序产出 (SourceFile, 附带信息, 字节或 None, 释放函数)。
+    # 调用方在不再持有字节时调用释放函数（可作为 Future 的完成回调）；
+    # 调用方在消费时才拉取上游，附带信息（如缓存查询结果）始终在调用方线程中计算
+    limit = memory_mb * 1048576
+    budget = _Budget(limit)
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="prefetch")
+    ready = deque()
+    held = None
+    it = iter(items)
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(ready) < window:
+                if held is None:
+                    held = next(it, None)
+                    if held is None:
+                        exhausted = True
+                        break
+                source, info, wanted = held
+                size = source.size if wanted and source.size <= limit else 0
+                # 超出内存上限时先产出已预读的文件；队列为空时等待提交出去的数据释放
+                if size and not budget.acquire(size, block=not ready):
+                    break
+                future = pool.submit(_read_bytes, source.path) if size else None
+                ready.append((source, info, future, size))
+                held = None
+            if not ready:
+                return
+            source, info, future, size = ready.popleft()
+            data = future.result() if future is not None else None
+            release = budget.releaser(size)
+            if data is None:
+                release()
+            yield source, info, data, release
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,175 @@
+import json
+import hashlib
+from xlsx_reader import parse_cell, column_letter
+
+# 模板指纹：由工作表名、主工作表的尺寸（dimension）与若干锚点标签单元格组成，保存在配置的 "fingerprint" 中：
+#   "fingerprint": {"sheets": ["调查表"], "dimension": "A1:X90", "anchors": {"C4": "省级编号", ...}}
+# 提取时一并读取锚点单元格，与配置的指纹比对：旧版模板的文件不会从错位的单元格中静默取值，
+# 而是在输出任何记录前报告为模板不匹配；同一批文件可按指纹自动选用对应的配置。
+
+# 从样本学习指纹时最多保留的锚点数，以及在数据单元格左侧寻找标签的范围
+MAX_ANCHORS = 8
+LABEL_SEARCH_COLS = 6
+
+
+class TemplateMismatchError(ValueError):
+    pass
+
+
+def _normalize(text):
+    # 比对锚点时忽略空白差异
+    return "".join(str(text).split()) if text is not None else ""
+
+
+class TemplateFingerprint:
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError("fingerprint 应为 JSON 对象")
+        sheets = spec.get("sheets") or []
+        if not isinstance(sheets, list) or not all(isinstance(name, str) for name in sheets):
+            raise ValueError("fingerprint.sheets 应为工作表名列表")
+        anchors = spec.get("anchors") or {}
+        if not isinstance(anchors, dict):
+            raise ValueError("fingerprint.anchors 应为 {单元格: 标签} 对象")
+        dimension = spec.get("dimension")
+        if dimension is not None and not isinstance(dimension, str):
+            raise ValueError("fingerprint.dimension 应为区域字符串，如 A1:X90")
+        if not sheets and not anchors:
+            raise ValueError("fingerprint 至少需要 sheets 或 anchors")
+        self.spec = spec
+        self.sheets = sheets
+        self.dimension = dimension.upper() if dimension else None
+        self.anchors = [(parse_cell(cell), cell, _normalize(text)) for cell, text in anchors.items()]
+        self.coords = [coord for coord, _, _ in self.anchors]
+
+    def mismatches(self, sheet_names, values):
+        # 返回不符之处的说明列表，全部相符时为空；尺寸不同不算不符，只用于在多个相符的模板中择优
+        problems = [f"缺少工作表“{name}”" for name in self.sheets if name not in sheet_names]
+        for coord, cell, expected in self.anchors:
+            actual = _normalize(values.get(coord))
+            if actual != expected:
+                problems.append(f"{cell} 应为“{expected}”，实际为“{actual}”")
+        return problems
+
+    def same_dimension(self, dimension):
+        return self.dimension is not None and dimension is not None and dimension.upper() == self.dimension
+
+
+class TemplateRouter:
+    # 与 ExtractionPlan 接口一致（requests、build_rows、header_names、config_hash），可直接交给工作进程。
+    # 依次比对主配置与候选配置的指纹，选用相符的配置提取，记录按主配置的表头顺序输出；
+    # 都不相符时抛出 TemplateMismatchError，该文件不输出任何记录
+    def __init__(self, primary, alternatives=()):
+        self.primary = primary
+        self.config = primary.config
+        self.header_names = primary.header_names
+        self.column_types = primary.column_types
+        self.candidates = []
+        self.skipped = []
+        self.requests = []
+        for plan in [primary] + [p for p in alternatives if p is not primary]:
+            if plan is not primary:
+                if plan.fingerprint is None or plan.config_hash == primary.config_hash:
+                    continue
+                if not set(primary.header_names) <= set(plan.header_names):
+                    # 表头不同的配置属于其他表单，不参与选择
+                    self.skipped.append(plan.name)
+                    continue
+            column_map = [plan.header_names.index(name) for name in primary.header_names]
+            start = len(self.requests)
+            self.requests.extend(plan.requests)
+            anchor_request = None
+            if plan.fingerprint is not None and plan.fingerprint.coords:
+                anchor_request = len(self.requests)
+                self.requests.append(plan.main_request(plan.fingerprint.coords))
+            self.candidates.append((plan, slice(start, start + len(plan.requests)), anchor_request, column_map))
+        payload = [(plan.config_hash, plan.fingerprint.spec if plan.fingerprint else None)
+                   for plan, _, _, _ in self.candidates]
+        self.config_hash = hashlib.sha1(json.dumps(payload, ensure_ascii=False, sort_keys=True)
+                                        .encode("utf-8")).hexdigest()
+
+    @property
+    def names(self):
+        return [plan.name for plan, _, _, _ in self.candidates]
+
+    def match(self, sheet_values, layout):
+        # 返回 (选用的候选项, 主配置的不符说明)。优先级：指纹相符且尺寸相同 > 指纹相符 > 没有指纹的主配置
+        sheet_names = layout.get("sheets", [])
+        matched = []
+        primary_problems = None
+        for candidate in self.candidates:
+            plan, _, anchor_request, _ = candidate
+            if plan.fingerprint is None:
+                matched.append((0, candidate))
+                continue
+            sheets = sheet_values[anchor_request] if anchor_request is not None else []
+            values = sheets[0][1] if sheets else {}
+            dimension = layout.get("dimensions", {}).get(sheets[0][0]) if sheets else None
+            problems = plan.fingerprint.mismatches(sheet_names, values)
+            if plan is self.primary:
+                primary_problems = problems
+            if not problems:
+                matched.append((2 if plan.fingerprint.same_dimension(dimension) else 1, candidate))
+        if not matched:
+            return None, primary_problems
+        # 优先级相同时主配置在前
+        best = max(priority for priority, _ in matched)
+        return next(c for priority, c in matched if priority == best), primary_problems
+
+    def build_rows(self, sheet_values, layout=None):
+        candidate, problems = self.match(sheet_values, layout or {})
+        if candidate is None:
+            raise TemplateMismatchError(
+                f"模板不匹配（{self.primary.name or '当前配置'}）：" + "；".join(problems[:5]))
+        plan, values_slice, _, column_map = candidate
+        rows = plan.build_rows(sheet_values[values_slice])
+        if layout is not None:
+            layout["template"] = plan.name or "当前配置"
+        if plan is self.primary:
+            return rows
+        return [[row[i] for i in column_map] for row in rows]
+
+
+def learn_fingerprint(file_path, plan, engine="fast"):
+    # 从一个样本工作簿生成指纹：配置读取的工作表名、主工作表尺寸，以及主工作表数据单元格左侧（或上方）的标签
+    from excel_processor import select_backend
+    candidates = {}
+    for key, coords, _ in plan.columns:
+        if key != plan.main_key:
+            continue
+        r, c = coords[0]
+        cells = [(r, c - k) for k in range(1, LABEL_SEARCH_COLS + 1) if c - k >= 1]
+        if r > 1:
+            cells.append((r - 1, c))
+        candidates[(r, c)] = cells
+    data_cells = {coords[0] for _, coords, _ in plan.columns}
+    lookup = sorted({cell for cells in candidates.values() for cell in cells} - data_cells)
+    requests = plan.requests + [plan.main_request(lookup)]
+    layout = {}
+    with open(file_path, "rb") as f:
+        backend = select_backend(f.read(8), file_path, engine)
+        f.seek(0)
+        sheet_values = backend.read_sheets(f, requests, layout=layout)
+    main_sheets = sheet_values[-1]
+    if not main_sheets:
+        raise ValueError("样本中未找到配置指定的工作表")
+    main_name, values = main_sheets[0]
+    anchors = {}
+    for cells in candidates.values():
+        for r, c in cells:
+            text = values.get((r, c))
+            if isinstance(text, str) and text.strip() and (r, c) not in data_cells:
+                anchors[f"{column_letter(c)}{r}"] = text.strip()
+                break
+        if len(anchors) >= MAX_ANCHORS:
+            break
+    sheet_names = []
+    for sheets in sheet_values[:-1]:
+        for name, _ in sheets:
+            if name not in sheet_names:
+                sheet_names.append(name)
+    fingerprint = {"sheets": sheet_names, "anchors": anchors}
+    dimension = layout.get("dimensions", {}).get(main_name)
+    if dimension:
+        fingerprint["dimension"] = dimension
+    return fingerprint
@@ -0,0 +1,71 @@
+import time
+
+# 剩余时间与吞吐量估计：按字节计算处理速度（大小悬殊的文件混在一起时按文件数估计误差很大），
+# 速度用指数加权移动平均平滑，剩余字节数取后台枚举已发现的文件总大小。
+# 每隔 min_interval 秒采样一次，避免并行提取时结果成批返回造成的瞬时速度抖动。
+
+
+class ThroughputEstimator:
+    def __init__(self, alpha=0.3, min_interval=0.5):
+        self.alpha = alpha
+        self.min_interval = min_interval
+        self.started_at = time.perf_counter()
+        self.files_done = 0
+        self.bytes_done = 0
+        # 平滑后的速度，第一次采样前为 None
+        self.files_per_sec = None
+        self.bytes_per_sec = None
+        self._last_sample = self.started_at
+        self._sample_files = 0
+        self._sample_bytes = 0
+
+    def update(self, nbytes, nfiles=1, now=None):
+        now = time.perf_counter() if now is None else now
+        self.files_done += nfiles
+        self.bytes_done += nbytes
+        self._sample_files += nfiles
+        self._sample_bytes += nbytes
+        interval = now - self._last_sample
+        if interval < self.min_interval:
+            return
+        files_rate = self._sample_files / interval
+        bytes_rate = self._sample_bytes / interval
+        if self.bytes_per_sec is None:
+            self.files_per_sec, self.bytes_per_sec = files_rate, bytes_rate
+        else:
+            self.files_per_sec += self.alpha * (files_rate - self.files_per_sec)
+            self.bytes_per_sec += self.alpha * (bytes_rate - self.bytes_per_sec)
+        self._last_sample = now
+        self._sample_files = self._sample_bytes = 0
+
+    def exclude_time(self, seconds):
+        # 暂停等不属于处理过程的时间从计时中扣除
+        self.started_at += seconds
+        self._last_sample += seconds
+
+    def _rates(self, now=None):
+        # 第一次采样前使用开始以来的平均速度
+        if self.bytes_per_sec is not None:
+            return self.files_per_sec, self.bytes_per_sec
+        elapsed = (time.perf_counter() if now is None else now) - self.started_at
+        if elapsed <= 0:
+            return None, None
+        return self.files_done / elapsed, self.bytes_done / elapsed
+
+    def remaining_seconds(self, total_files, total_bytes, now=None):
+        files_rate, bytes_rate = self._rates(now)
+        remaining_bytes = max(0, total_bytes - self.bytes_done)
+        if bytes_rate:
+            return remaining_bytes / bytes_rate
+        # 已处理的文件都是空文件等无法按字节估计的情况，退回按文件数估计
+        remaining_files = max(0, total_files - self.files_done)
+        if files_rate:
+            return remaining_files / files_rate
+        return 0.0
+
+    def snapshot(self, now=None):
+        files_rate, bytes_rate = self._rates(now)
+        return {
+            "files_per_sec": round(files_rate or 0.0, 2),
+            "mb_per_sec": round((bytes_rate or 0.0) / 1048576, 2),
+        }
@@ -0,0 +1,157 @@
+import time
+import zipfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from discovery import iter_source_files
+from excel_processor import ExcelProcessor
+from extract_cache import ExtractCache
+from extraction_plan import ExtractionPlan, compile_plan
+from isolated_pool import IsolatedPool
+
+# 监视模式：定期扫描源目录（轮询，网络共享上同样可用），新增或修改的工作簿在大小与修改时间
+# 保持 settle_secs 秒不变、且能完整打开后才视为写完；有写完的变化时以增量模式合并，
+# 只提取这些文件并更新输出。不依赖界面事件循环，可在无图形环境的服务器上长期运行。
+# 提取失败的文件在再次修改后才重试；已删除文件的记录保留在输出中（与增量合并一致）。
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_SETTLE_SECS = 3.0
+
+
+def is_complete(path):
+    # xlsx 为 zip 包，末尾的中央目录写完之前无法打开；xls 至少要有可识别格式的文件头
+    try:
+        if path.lower().endswith(".xlsx"):
+            with zipfile.ZipFile(path) as zf:
+                return "[Content_Types].xml" in zf.namelist()
+        with open(path, "rb") as f:
+            return len(f.read(8)) == 8
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+class FolderWatcher:
+    def __init__(self, src_dir, out_dir, config, key_column, interval=DEFAULT_INTERVAL,
+                 settle_secs=DEFAULT_SETTLE_SECS, workers=1, engine="fast", cache_path=None, logger=None,
+                 recursive=False, include=None, exclude=None, file_timeout=None, **options):
+        # config 为配置字典或已编译的 ExtractionPlan；key_column 为增量合并的标识列；
+        # options 为传给 ExcelProcessor 的其他参数（输出格式、去重、内存预算等）
+        self.src_dir = src_dir
+        self.out_dir = out_dir
+        self.plan = config if isinstance(config, ExtractionPlan) else compile_plan(config)
+        self.plan.check_key_column(key_column)
+        if options.get("dedup_key") not in (None, key_column):
+            raise ValueError(f"监视模式下去重标识列需与增量标识列相同（{options['dedup_key']} / {key_column}）")
+        self.key_column = key_column
+        self.interval = max(0.1, float(interval))
+        self.settle_secs = max(0.0, float(settle_secs))
+        self.workers = max(1, int(workers or 1))
+        self.engine = engine
+        self.cache_path = cache_path
+        self.logger = logger if logger else print
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.file_timeout = file_timeout
+        self.options = options
+        self.merges = 0
+        self.processor = None
+        # 相对路径 -> (大小, 修改时间)：已交给合并的文件状态
+        self._seen = {}
+        # 相对路径 -> [(大小, 修改时间), 首次看到该状态的时间, 是否已提示]：尚未写完的文件
+        self._pending = {}
+        self._stop = threading.Event()
+
+    def stop(self):
+        # 可由其他线程或信号处理函数调用；正在进行的合并会被取消，已更新的文件保留在增量索引中
+        self._stop.set()
+        processor = self.processor
+        if processor is not None:
+            processor.cancel()
+
+    def scan(self):
+        sources = iter_source_files(self.src_dir, recursive=self.recursive, include=self.include,
+                                    exclude=self.exclude, skip_dirs=[self.out_dir])
+        return {source.rel_path: source for source in sources}
+
+    def settled_changes(self, sources, now):
+        # 返回已写完的新增或修改文件；其余变化的文件继续等待
+        ready = []
+        for rel_path, source in sources.items():
+            state = (source.size, source.mtime_ns)
+            if self._seen.get(rel_path) == state:
+                self._pending.pop(rel_path, None)
+                continue
+            pending = self._pending.get(rel_path)
+            if pending is None or pending[0] != state:
+                self._pending[rel_path] = [state, now, False]
+            elif now - pending[1] >= self.settle_secs:
+                if is_complete(source.path):
+                    ready.append(source)
+                elif not pending[2]:
+                    pending[2] = True
+                    self.logger(f"文件 {rel_path} 已不再变化但无法完整打开（未写完或已损坏），修改后再处理")
+        for rel_path in [p for p in self._pending if p not in sources]:
+            del self._pending[rel_path]
+        return ready
+
+    def run(self):
+        # 阻塞运行直到 stop()；进程池与提取缓存在各次合并之间复用
+        if self.file_timeout:
+            executor = IsolatedPool(self.workers, self.file_timeout)
+        else:
+            executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        cache = ExtractCache(self.cache_path) if self.cache_path else None
+        self.logger(f"开始监视 {self.src_dir}，每 {self.interval:g} 秒扫描一次，"
+                    f"文件 {self.settle_secs:g} 秒内无变化后合并，标识列: {self.key_column}")
+        try:
+            while not self._stop.is_set():
+                try:
+                    sources = self.scan()
+                except OSError as e:
+                    self.logger(f"无法读取源目录: {e}")
+                    self._stop.wait(self.interval)
+                    continue
+                ready = self.settled_changes(sources, time.monotonic())
+                if ready:
+                    self.merge(ready, sources, executor, cache)
+                self._stop.wait(self.interval)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if cache:
+                cache.close()
+            self.logger("已停止监视")
+
+    def merge(self, ready, sources, executor, cache):
+        # 只处理扫描时状态已确定的文件：已写完的变化文件，以及此前合并过且未再变化的文件
+        allowed = {source.rel_path: (source.size, source.mtime_ns) for source in ready}
+        for rel_path, source in sources.items():
+            if self._seen.get(rel_path) == (source.size, source.mtime_ns):
+                allowed[rel_path] = self._seen[rel_path]
+        names = "、".join(source.rel_path for source in ready[:5])
+        more = f" 等 {len(ready)} 个文件" if len(ready) > 5 else ""
+        self.logger(f"检测到新增或修改的文件: {names}{more}")
+        start = time.time()
+        try:
+            self.processor = ExcelProcessor(
+                self.src_dir, self.out_dir, self.plan, logger=self.logger, workers=self.workers,
+                engine=self.engine, cache=cache, executor=executor, recursive=self.recursive,
+                include=self.include, exclude=self.exclude, upsert_key=self.key_column,
+                file_timeout=self.file_timeout,
+                source_filter=lambda source: allowed.get(source.rel_path) == (source.size, source.mtime_ns),
+                **self.options)
+            if self._stop.is_set():
+                return
+            _, rows, _ = self.processor.merge_excels()
+            if not self.processor.cancelled:
+                self.merges += 1
+                self.logger(f"输出已更新: {', '.join(self.processor.out_paths)}，记录数 {rows}，"
+                            f"用时 {time.time() - start:.1f} 秒")
+        except Exception as e:
+            self.logger(f"合并出错: {e}")
+        finally:
+            self.processor = None
+            # 失败的文件不再反复重试，修改后再处理
+            for source in ready:
+                self._seen[source.rel_path] = (source.size, source.mtime_ns)
+                self._pending.pop(source.rel_path, None)
@@ -0,0 +1,376 @@
+import re
+import time
+import zipfile
+import posixpath
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+# 只解析 .xlsx 压缩包中所需工作表的 XML 和共享字符串表，按需读取配置的单元格，
+# 不构建 openpyxl 的完整对象模型。取值规则与 openpyxl 的 data_only=True 保持一致。
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_CELL_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?([1-9][0-9]*)$")
+_REF_SPLIT_RE = re.compile(r"([A-Za-z]+)([0-9]*)")
+
+# 内置日期/时间格式编号与其中的时长格式（46 为 [h]:mm:ss），与 openpyxl 的内置格式表一致；
+# 区域设置相关的 27-36、50-58 在 openpyxl 中没有格式代码，按数字返回
+_BUILTIN_DATE_FORMATS = set(range(14, 23)) | {45, 46, 47}
+_BUILTIN_TIMEDELTA_FORMATS = {46}
+_FMT_STRIP_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+_FMT_DATE_RE = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+_FMT_TIMEDELTA_RE = re.compile(r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?", re.I)
+
+_WINDOWS_EPOCH = datetime(1899, 12, 30)
+_MAC_EPOCH = datetime(1904, 1, 1)
+
+# 同一模板生成的文件，workbook.xml、关系文件与 styles.xml 通常完全相同。按压缩包目录中记录的
+# CRC 与大小缓存其解析结果（工作表名到部件的映射、日期样式），同模板的后续文件不再解析这些部件。
+# 缓存在每个进程内各自保存，超过上限时整体清空
+_TEMPLATE_CACHE_LIMIT = 256
+_workbook_cache = {}
+_styles_cache = {}
+
+
+def column_index(letters):
+    # "A" -> 1, "AA" -> 27
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def column_letter(index):
+    # 1 -> "A", 27 -> "AA"
+    letters = ""
+    while index > 0:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def parse_cell(ref):
+    # "D4" -> (4, 4)，非法地址抛出 ValueError
+    match = _CELL_RE.match(str(ref).strip())
+    if not match:
+        raise ValueError(f"无效的单元格地址: {ref}")
+    col = column_index(match.group(1))
+    if col > 16384:
+        raise ValueError(f"无效的单元格地址: {ref}")
+    return int(match.group(2)), col
+
+
+def _text_of(elem):
+    # 富文本/内联字符串：拼接 t 与 r/t，忽略拼音 rPh
+    t = elem.find(f"{NS_MAIN}t")
+    if t is not None:
+        return t.text or ""
+    return "".join(r.findtext(f"{NS_MAIN}t") or "" for r in elem.iter(f"{NS_MAIN}r"))
+
+
+def _resolve_target(base_dir, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def _read_rels(zf, part):
+    # 返回 {rId: (Type, 目标部件路径)}
+    base_dir, name = posixpath.split(part)
+    rels_part = posixpath.join(base_dir, "_rels", f"{name}.rels")
+    rels = {}
+    if rels_part not in zf.NameToInfo:
+        return rels
+    with zf.open(rels_part) as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{NS_PKG}Relationship":
+                rels[elem.get("Id")] = (elem.get("Type", ""), _resolve_target(base_dir, elem.get("Target", "")))
+    return rels
+
+
+def _workbook_part(zf):
+    for rel_type, target in _read_rels(zf, "").values():
+        if rel_type.endswith("/officeDocument"):
+            return target
+    return "xl/workbook.xml"
+
+
+def _part_key(zf, parts):
+    # 返回各部件 (路径, CRC, 大小) 组成的缓存键，任一部件不存在时返回 None（不缓存）
+    key = []
+    for part in parts:
+        info = zf.NameToInfo.get(part)
+        if info is None:
+            return None
+        key.append((part, info.CRC, info.file_size))
+    return tuple(key)
+
+
+def _cached(cache, key, load):
+    if key is None:
+        return load()
+    value = cache.get(key)
+    if value is None:
+        if len(cache) >= _TEMPLATE_CACHE_LIMIT:
+            cache.clear()
+        value = cache[key] = load()
+    return value
+
+
+def _cached_workbook(zf):
+    # 默认位置的工作簿按根关系、workbook.xml 与其关系文件的 CRC 缓存
+    key = _part_key(zf, ("_rels/.rels", "xl/workbook.xml", "xl/_rels/workbook.xml.rels"))
+    return _cached(_workbook_cache, key, lambda: _read_workbook(zf))
+
+
+def _read_workbook(zf):
+    # 返回 ([(工作表名, 部件路径), ...], 活动工作表序号, 是否 1904 日期系统, 样式部件路径, 共享字符串部件路径)
+    wb_part = _workbook_part(zf)
+    rels = _read_rels(zf, wb_part)
+    sheets = []
+    active_tab = 0
+    date1904 = False
+    with zf.open(wb_part) as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{NS_MAIN}sheet":
+                rel = rels.get(elem.get(f"{NS_REL}id"))
+                sheets.append((elem.get("name"), rel[1] if rel else None))
+            elif elem.tag == f"{NS_MAIN}workbookView":
+                active_tab = int(elem.get("activeTab", 0))
+            elif elem.tag == f"{NS_MAIN}workbookPr":
+                date1904 = elem.get("date1904") in ("1", "true")
+    if not sheets:
+        raise ValueError("工作簿中没有工作表")
+    if not 0 <= active_tab < len(sheets):
+        active_tab = 0
+    styles_part = shared_part = None
+    for rel_type, target in rels.values():
+        if rel_type.endswith("/styles"):
+            styles_part = target
+        elif rel_type.endswith("/sharedStrings"):
+            shared_part = target
+    return sheets, active_tab, date1904, styles_part, shared_part
+
+
+def _scan_sheet(zf, sheet_part, targets, max_row, max_col):
+    # 顺序扫描 sheetData，只记录目标单元格的原始值；越过最大行即停止。
+    # 返回 ({坐标: 原始值}, 工作表记录的尺寸 dimension 或 None)
+    found = {}
+    dimension = None
+    row_idx = col_idx = 0
+    with zf.open(sheet_part) as f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == f"{NS_MAIN}dimension":
+                    dimension = elem.get("ref")
+                elif tag == f"{NS_MAIN}row":
+                    r = elem.get("r")
+                    row_idx = int(r) if r else row_idx + 1
+                    col_idx = 0
+                    if row_idx > max_row:
+                        break
+                continue
+            if tag == f"{NS_MAIN}c":
+                ref = elem.get("r")
+                if ref:
+                    letters, _ = _REF_SPLIT_RE.match(ref).groups()
+                    col_idx = column_index(letters)
+                else:
+                    col_idx += 1
+                if col_idx <= max_col and (row_idx, col_idx) in targets:
+                    data_type = elem.get("t", "n")
+                    if data_type == "inlineStr":
+                        inline = elem.find(f"{NS_MAIN}is")
+                        value = _text_of(inline) if inline is not None else None
+                    else:
+                        v = elem.find(f"{NS_MAIN}v")
+                        value = v.text if v is not None else None
+                    found[(row_idx, col_idx)] = (data_type, value, int(elem.get("s", 0)))
+                    if len(found) == len(targets):
+                        break
+            elif tag == f"{NS_MAIN}row":
+                elem.clear()
+    return found, dimension
+
+
+def _load_shared_strings(zf, shared_part, wanted):
+    # 只取出需要的序号，返回 {序号: 文本}；读到最大的所需序号即停止，其余条目不拼接文本
+    strings = {}
+    if not wanted or not shared_part or shared_part not in zf.NameToInfo:
+        return strings
+    last = max(wanted)
+    index = 0
+    with zf.open(shared_part) as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{NS_MAIN}si":
+                if index in wanted:
+                    strings[index] = _text_of(elem)
+                elem.clear()
+                if index >= last:
+                    break
+                index += 1
+    return strings
+
+
+def _is_date_format(fmt):
+    fmt = _FMT_STRIP_RE.sub("", fmt.split(";")[0])
+    return _FMT_DATE_RE.search(fmt) is not None
+
+
+def _date_styles(zf, styles_part):
+    # 返回 (日期样式编号集合, 时长样式编号集合)，只解析 numFmts 与 cellXfs
+    date_ids, timedelta_ids = set(), set()
+    if not styles_part or styles_part not in zf.NameToInfo:
+        return date_ids, timedelta_ids
+    custom = {}
+    xf_index = 0
+    in_cell_xfs = False
+    with zf.open(styles_part) as f:
+        for event, elem in iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if tag == f"{NS_MAIN}cellXfs":
+                in_cell_xfs = event == "start"
+                if not in_cell_xfs:
+                    break
+            elif event == "end" and tag == f"{NS_MAIN}numFmt":
+                custom[int(elem.get("numFmtId"))] = elem.get("formatCode", "")
+            elif event == "end" and in_cell_xfs and tag == f"{NS_MAIN}xf":
+                fmt_id = int(elem.get("numFmtId", 0))
+                if fmt_id in custom:
+                    fmt = custom[fmt_id]
+                    if _is_date_format(fmt):
+                        date_ids.add(xf_index)
+                        if _FMT_TIMEDELTA_RE.search(fmt.split(";")[0]):
+                            timedelta_ids.add(xf_index)
+                elif fmt_id in _BUILTIN_DATE_FORMATS:
+                    date_ids.add(xf_index)
+                    if fmt_id in _BUILTIN_TIMEDELTA_FORMATS:
+                        timedelta_ids.add(xf_index)
+                xf_index += 1
+    return date_ids, timedelta_ids
+
+
+def _cast_number(value):
+    if "." in value or "E" in value or "e" in value:
+        return float(value)
+    return int(value)
+
+
+def _from_excel(value, epoch, as_timedelta):
+    if as_timedelta:
+        # 与 openpyxl 相同，精确到毫秒
+        td = timedelta(days=value)
+        if td.microseconds:
+            td = timedelta(seconds=td.total_seconds() // 1, microseconds=round(td.microseconds, -3))
+        return td
+    day, fraction = divmod(value, 1)
+    diff = timedelta(milliseconds=round(fraction * 86400 * 1000))
+    if 0 <= value < 1 and diff.days == 0:
+        return (datetime.min + diff).time()
+    if 0 < value < 60 and epoch == _WINDOWS_EPOCH:
+        day += 1
+    return epoch + timedelta(days=day) + diff
+
+
+def read_sheets(source, requests, stats=None, styles=True, layout=None):
+    # source 可以是文件路径或二进制文件对象。requests 中每项需提供 select(工作表名列表, 活动序号)、
+    # targets（坐标集合）、max_row、max_col；同一工作表上的多个请求合并为一次顺序扫描。
+    # 返回与 requests 对应的列表，每项为 [(工作表名, {坐标: 值}), ...]。
+    # styles=False 时不读取 styles.xml，日期单元格按 Excel 序列号（数字）返回。
+    # 传入 stats 字典时记录各阶段耗时（stats["stages"]）与读取的压缩字节数（stats["bytes_read"]）；
+    # 传入 layout 字典时记录全部工作表名（layout["sheets"]）与已扫描工作表的尺寸（layout["dimensions"]）
+    stages = {}
+    mark = time.perf_counter()
+
+    def lap(name):
+        nonlocal mark
+        now = time.perf_counter()
+        stages[name] = stages.get(name, 0.0) + now - mark
+        mark = now
+
+    with zipfile.ZipFile(source) as zf:
+        lap("zip_open")
+        sheets, active_tab, date1904, styles_part, shared_part = _cached_workbook(zf)
+        names = [name for name, _ in sheets]
+        selected = [request.select(names, active_tab) for request in requests]
+        by_sheet = {}
+        for indices, request in zip(selected, requests):
+            for index in indices:
+                by_sheet.setdefault(index, []).append(request)
+        parts_read = []
+        lap("workbook")
+
+        raw_by_sheet = {}
+        dimensions = {}
+        for index, sheet_requests in sorted(by_sheet.items()):
+            part = sheets[index][1]
+            if part is None or part not in zf.NameToInfo:
+                # 图表工作表等没有单元格数据
+                raw_by_sheet[index] = {}
+                continue
+            targets = set().union(*(r.targets for r in sheet_requests))
+            max_row = max(r.max_row for r in sheet_requests)
+            max_col = max(r.max_col for r in sheet_requests)
+            if targets:
+                raw_by_sheet[index], dimensions[names[index]] = _scan_sheet(zf, part, targets, max_row, max_col)
+                parts_read.append(part)
+            else:
+                raw_by_sheet[index] = {}
+        lap("sheet_scan")
+
+        all_raw = [item for raw in raw_by_sheet.values() for item in raw.values()]
+        shared = None
+        wanted = {int(v) for t, v, _ in all_raw if t == "s" and v is not None}
+        if wanted:
+            shared = _load_shared_strings(zf, shared_part, wanted)
+            parts_read.append(shared_part)
+            lap("shared_strings")
+        date_ids = timedelta_ids = ()
+        if styles and any(t == "n" and s and v is not None for t, v, s in all_raw) \
+                and styles_part in zf.NameToInfo:
+            def load_styles():
+                parts_read.append(styles_part)
+                return _date_styles(zf, styles_part)
+            date_ids, timedelta_ids = _cached(_styles_cache, _part_key(zf, (styles_part,)), load_styles)
+            lap("styles")
+        if stats is not None:
+            stats["bytes_read"] = sum(zf.NameToInfo[p].compress_size for p in parts_read if p in zf.NameToInfo)
+
+    if layout is not None:
+        layout["sheets"] = names
+        layout["dimensions"] = dimensions
+    epoch = _MAC_EPOCH if date1904 else _WINDOWS_EPOCH
+    values_by_sheet = {index: {coord: _convert(raw_value, shared, date_ids, timedelta_ids, epoch)
+                               for coord, raw_value in raw.items()}
+                       for index, raw in raw_by_sheet.items()}
+    if stats is not None:
+        lap("convert")
+        stats["stages"] = stages
+        stats["cells"] = len(all_raw)
+    return [[(names[i], values_by_sheet[i]) for i in indices] for indices in selected]
+
+
+def _convert(raw_value, shared, date_ids, timedelta_ids, epoch):
+    data_type, value, style_id = raw_value
+    if value is None:
+        return None
+    if data_type == "s":
+        return shared[int(value)]
+    if data_type == "n":
+        number = _cast_number(value)
+        if style_id in date_ids:
+            try:
+                number = _from_excel(number, epoch, style_id in timedelta_ids)
+            except (OverflowError, ValueError):
+                # 超出日期范围的序列号按错误值返回（与 openpyxl 相同）
+                return "#VALUE!"
+        return number
+    if data_type == "b":
+        return value == "1" or value == "true"
+    if data_type == "d":
+        return datetime.fromisoformat(value.rstrip("Z"))
+    # str（公式结果）、inlineStr、e（错误值）均按字符串返回
+    return value